@@ -3,7 +3,7 @@ from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from trips.models import Trip
+from trips.models import TripSummary
 
 try:
     from ..models import DailyLog
@@ -13,26 +13,19 @@ except Exception:
     HAS_DAILY_LOG = False
 
 
-def _trip_summary(trip):
-    calc = trip.calc_payload or {}
-    places = calc.get("places") or {}
-    route = calc.get("route") or {}
-    stats = calc.get("stats") or {}
-
-    pickup_name = (places.get("pickup") or {}).get("name") or ""
-    dropoff_name = (places.get("dropoff") or {}).get("name") or ""
-    dist_m = route.get("distance_m") or 0
-    dur_s = route.get("duration_s") or 0
+def _trip_summary(summary):
+    dist_m = summary.distance_m or 0
+    dur_s = summary.duration_s or 0
 
     return {
-        "id": str(trip.id),
-        "created_at": trip.created_at,
-        "pickup_location": pickup_name,
-        "dropoff_location": dropoff_name,
-        "status": "completed",
+        "id": str(summary.trip_id),
+        "created_at": summary.created_at,
+        "pickup_location": summary.pickup_location,
+        "dropoff_location": summary.dropoff_location,
+        "status": summary.status,
         "trip_distance_miles": round(dist_m / 1609.344, 1) if dist_m else None,
         "estimated_duration_min": round(dur_s / 60) if dur_s else None,
-        "current_cycle_hours": stats.get("cycle_hours_used_after"),
+        "current_cycle_hours": summary.cycle_hours_used_after,
     }
 
 
@@ -41,7 +34,8 @@ class DashboardAnalyticsView(APIView):
 
     def get(self, request):
         user = request.user
-        qs = Trip.objects.filter(user=user).order_by("-created_at")
+        # TripSummary rows only: no calc_payload is loaded, however many trips the user has
+        qs = TripSummary.objects.filter(user=user).order_by("-created_at")
 
         total_trips = qs.count()
         completed_trips = total_trips
@@ -51,12 +45,9 @@ class DashboardAnalyticsView(APIView):
 
         current_cycle_hours = None
         if recent_trips:
-            for t in qs:
-                s = (t.calc_payload or {}).get("stats") or {}
-                v = s.get("cycle_hours_used_after")
-                if isinstance(v, (int, float)):
-                    current_cycle_hours = round(float(v), 1)
-                    break
+            v = qs.filter(cycle_hours_used_after__isnull=False).values_list("cycle_hours_used_after", flat=True).first()
+            if v is not None:
+                current_cycle_hours = round(float(v), 1)
 
         recent_logs = []
         compliance_rate = None
@@ -4,6 +4,16 @@ set -e
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
 
+# SERVER_MODE=asgi serves core.asgi through uvicorn workers so async views
+# (e.g. /api/trip/calculate/async) can multiplex upstream I/O per worker.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+  exec gunicorn core.asgi:application \
+    -k uvicorn_worker.UvicornWorker \
+    --bind 0.0.0.0:${PORT:-8000} \
+    --workers ${WEB_CONCURRENCY:-3} \
+    --timeout 120
+fi
+
 exec gunicorn core.wsgi:application \
   --bind 0.0.0.0:${PORT:-8000} \
   --workers 3 \
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
 
 
+def _start_render_pool(**kwargs):
+    # imported here: jobs pulls in WeasyPrint, which management commands should not need
+    from .services.jobs import start_inprocess_workers
+
+    start_inprocess_workers()
+
+
 class TripsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "trips"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        request_started.connect(_start_render_pool, dispatch_uid="trips.start_inprocess_workers")
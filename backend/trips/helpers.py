@@ -1,22 +1,21 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-import math
+from functools import partial
+import queue
+import threading
+import time
+from typing import Iterator, List
 import uuid
-from typing import List, Tuple
-from .services.routing import osrm_route
-from .services.overpass import find_pois
 
-BREAK_AFTER_H = 8.0
-DAILY_DRIVE_CAP_H = 11.0
-FUEL_EVERY_MILES = 1000.0
-FUEL_DURATION_MIN = 20
-PICKUP_DURATION_MIN = 60
-DROPOFF_DURATION_MIN = 60
-REST_DURATION_MIN = 600  # 10h
+from django.conf import settings
 
-EARTH_R = 6371000.0
-FUEL_EVERY_MILES = 1000.0
-BREAK_AFTER_H = 8.0
-DAILY_DRIVE_CAP_H = 11.0
+from .services import hos
+from .services.geometry import route_timeline
+from .services.routing import aosrm_route, osrm_route, osrm_table, route_key
+from .services.overpass import afind_pois, find_pois
+
+POI_RADIUS_M = 15000
 
 
 def _parse_iso(s: str) -> datetime:
@@ -75,54 +74,6 @@ def _parse_start(val) -> datetime:
     return dt
 
 
-def _haversine_m(lat1, lng1, lat2, lng2) -> float:
-    φ1, λ1 = math.radians(lat1), math.radians(lng1)
-    φ2, λ2 = math.radians(lat2), math.radians(lng2)
-    dφ, dλ = φ2 - φ1, λ2 - λ1
-    a = math.sin(dφ / 2) ** 2 + math.cos(φ1) * math.cos(φ2) * math.sin(dλ / 2) ** 2
-    return 2 * EARTH_R * math.asin(math.sqrt(a))
-
-
-def _route_distances_m(coords_lnglat: List[List[float]]) -> Tuple[float, List[float]]:
-    """Total distance and per-segment cumulative distances along LineString."""
-    if not coords_lnglat or len(coords_lnglat) < 2:
-        return 0.0, [0.0]
-    cum = [0.0]
-    total = 0.0
-    for i in range(1, len(coords_lnglat)):
-        lng1, lat1 = coords_lnglat[i - 1]
-        lng2, lat2 = coords_lnglat[i]
-        d = _haversine_m(lat1, lng1, lat2, lng2)
-        total += d
-        cum.append(total)
-    return total, cum
-
-
-def _interpolate_on_line(coords_lnglat: List[List[float]], cum: List[float], target_m: float) -> Tuple[float, float]:
-    """Return (lat, lng) at target distance along polyline."""
-    if not coords_lnglat:
-        return (0.0, 0.0)
-    total = cum[-1]
-    if target_m <= 0 or total <= 0:
-        return (coords_lnglat[0][1], coords_lnglat[0][0])
-    if target_m >= total:
-        last = coords_lnglat[-1]
-        return (last[1], last[0])
-    lo = 0
-    hi = len(cum) - 1
-    while lo < hi and cum[lo] < target_m:
-        lo += 1
-    i = max(1, lo)
-    prev_d = cum[i - 1]
-    seg_len = cum[i] - prev_d if cum[i] - prev_d > 0 else 1.0
-    t = (target_m - prev_d) / seg_len
-    lng1, lat1 = coords_lnglat[i - 1]
-    lng2, lat2 = coords_lnglat[i]
-    lat = lat1 + t * (lat2 - lat1)
-    lng = lng1 + t * (lng2 - lng1)
-    return (lat, lng)
-
-
 # --- internal: clip one segment into day buckets
 def _clip_segments_to_days(segments: list[dict]) -> list[dict]:
     """
@@ -168,123 +119,240 @@ def _clip_segments_to_days(segments: list[dict]) -> list[dict]:
     return out
 
 
-def plan_trip_payload(d: dict) -> dict:
+_poi_pool = None
+_poi_pool_lock = threading.Lock()
 
-    cur = (d["currentLocation"]["lng"], d["currentLocation"]["lat"])
-    pick = (d["pickupLocation"]["lng"], d["pickupLocation"]["lat"])
-    drop = (d["dropoffLocation"]["lng"], d["dropoffLocation"]["lat"])
-    start_dt = _parse_start(d["startTimeIso"])
 
-    cur_name = d["currentLocation"].get("name", "") or ""
-    pick_name = d["pickupLocation"].get("name", "") or ""
-    drop_name = d["dropoffLocation"].get("name", "") or ""
+def _get_poi_pool() -> ThreadPoolExecutor:
+    global _poi_pool
+    if _poi_pool is None:
+        with _poi_pool_lock:
+            if _poi_pool is None:
+                _poi_pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "POI_LOOKUP_WORKERS", 8), thread_name_prefix="poi-lookup"
+                )
+    return _poi_pool
 
-    route = osrm_route([cur, pick, drop])
-    coords = route["geometry"]["coordinates"]
-    total_dist_m = route["distance_m"]
-    total_drive_s = route["duration_s"]
 
-    total_line_m, cum = _route_distances_m(coords) if coords else (total_dist_m, [0.0])
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
 
-    d1 = _haversine_m(cur[1], cur[0], pick[1], pick[0])
-    d2 = _haversine_m(pick[1], pick[0], drop[1], drop[0])
-    denom = d1 + d2 if (d1 + d2) > 0 else 1.0
-    leg1_s = total_drive_s * (d1 / denom)
 
-    interrupts = []
+def _get_batch_pool() -> ThreadPoolExecutor:
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "TRIP_BATCH_WORKERS", 8), thread_name_prefix="trip-batch"
+                )
+    return _batch_pool
 
-    interrupts.append(
-        {
-            "name": "Pickup (1h)",
-            "type": "pickup",
-            "drive_s": leg1_s,
-            "dur_min": PICKUP_DURATION_MIN,
-            "coord": {"lat": pick[1], "lng": pick[0]},
-        }
-    )
 
-    # Break after 8h driving (if applicable)
-    if total_drive_s / 3600.0 >= BREAK_AFTER_H:
-        break_drive_s = BREAK_AFTER_H * 3600.0
-        frac = break_drive_s / total_drive_s if total_drive_s > 0 else 0.0
-        target_m = total_line_m * frac
-        lat_b, lng_b = _interpolate_on_line(coords, cum, target_m)
-        interrupts.append(
-            {
-                "name": "30m break (8h rule)",
-                "type": "break",
-                "drive_s": break_drive_s,
-                "dur_min": 30,
-                "coord": {"lat": lat_b, "lng": lng_b},
-            }
-        )
-
-    # Fuel at 1000 miles (if applicable)
-    total_miles = total_dist_m / 1609.344
-    if total_miles >= FUEL_EVERY_MILES:
-        fuel_target_m = min(total_line_m, 1609.344 * FUEL_EVERY_MILES)
-        frac = fuel_target_m / total_line_m if total_line_m > 0 else 0.0
-        fuel_drive_s = total_drive_s * frac
-        lat_f, lng_f = _interpolate_on_line(coords, cum, fuel_target_m)
-        pois = find_pois(lat_f, lng_f, "fuel", radius_m=15000)
-        coord = pois[0]["coord"] if pois else {"lat": lat_f, "lng": lng_f}
-        interrupts.append(
-            {
-                "name": "Fuel (20m)",
-                "type": "fuel",
-                "drive_s": fuel_drive_s,
-                "dur_min": FUEL_DURATION_MIN,
-                "coord": coord,
-                "poi": (
-                    {"name": pois[0].get("name"), "tags": pois[0].get("tags")} if pois else {"name": None, "tags": {}}
-                ),
-            }
-        )
-
-    # Rest at 11h driving (if applicable, i.e., multi-day trip)
-    multi_day = total_drive_s / 3600.0 >= DAILY_DRIVE_CAP_H
-    if multi_day:
-        rest_drive_s = DAILY_DRIVE_CAP_H * 3600.0
-        frac = rest_drive_s / total_drive_s if total_drive_s > 0 else 0.0
-        target_m = total_line_m * frac
-        lat_r, lng_r = _interpolate_on_line(coords, cum, target_m)
-        pois = find_pois(lat_r, lng_r, "rest", radius_m=15000)
-        coord = pois[0]["coord"] if pois else {"lat": lat_r, "lng": lng_r}
-        interrupts.append(
-            {
-                "name": "10h rest (11h daily drive cap)",
-                "type": "rest",
-                "drive_s": rest_drive_s,
-                "dur_min": REST_DURATION_MIN,
-                "coord": coord,
-                "poi": (
-                    {"name": pois[0].get("name"), "tags": pois[0].get("tags")} if pois else {"name": None, "tags": {}}
-                ),
-            }
-        )
-
-    # Dropoff occurs after full driving complete
-    interrupts.append(
-        {
-            "name": "Dropoff (1h)",
-            "type": "dropoff",
-            "drive_s": total_drive_s,
-            "dur_min": DROPOFF_DURATION_MIN,
-            "coord": {"lat": drop[1], "lng": drop[0]},
-        }
+def _poi_ref(pois: list) -> dict:
+    return {"name": pois[0].get("name"), "tags": pois[0].get("tags")} if pois else {"name": None, "tags": {}}
+
+
+def _resolve_pois(interrupts: list) -> None:
+    """
+    Run the POI lookups of every interrupt carrying a "poi_kind" together on the
+    shared pool. Lookups that fail or are still pending at the per-plan deadline
+    keep the interpolated coordinate. The deadline is passed down to each lookup,
+    which bounds its Overpass timeout and retries by it: a running future cannot
+    be cancelled, so lookups must end on their own once nobody waits for them.
+    """
+    pending = [it for it in interrupts if it.get("poi_kind")]
+    if not pending:
+        return
+    limit = getattr(settings, "POI_LOOKUP_DEADLINE_S", 20)
+    deadline = time.monotonic() + limit
+    pool = _get_poi_pool()
+    futures = {
+        pool.submit(
+            find_pois,
+            it["coord"]["lat"],
+            it["coord"]["lng"],
+            it.pop("poi_kind"),
+            radius_m=POI_RADIUS_M,
+            deadline=deadline,
+        ): it
+        for it in pending
+    }
+    done, _ = wait(futures, timeout=limit)
+    for fut, it in futures.items():
+        pois = []
+        if fut in done:
+            try:
+                pois = fut.result()
+            except Exception:
+                pois = []
+        else:
+            fut.cancel()
+        if pois:
+            it["coord"] = pois[0]["coord"]
+        it["poi"] = _poi_ref(pois)
+
+
+async def _aresolve_pois(interrupts: list) -> None:
+    """Async counterpart of _resolve_pois: gather the lookups on the running loop."""
+    pending = [it for it in interrupts if it.get("poi_kind")]
+    if not pending:
+        return
+    limit = getattr(settings, "POI_LOOKUP_DEADLINE_S", 20)
+    deadline = time.monotonic() + limit
+    tasks = {
+        asyncio.ensure_future(
+            afind_pois(
+                it["coord"]["lat"], it["coord"]["lng"], it.pop("poi_kind"), radius_m=POI_RADIUS_M, deadline=deadline
+            )
+        ): it
+        for it in pending
+    }
+    done, not_done = await asyncio.wait(tasks, timeout=limit)
+    for task in not_done:
+        task.cancel()
+    for task, it in tasks.items():
+        pois = []
+        if task in done and not task.cancelled() and task.exception() is None:
+            pois = task.result()
+        if pois:
+            it["coord"] = pois[0]["coord"]
+        it["poi"] = _poi_ref(pois)
+
+
+def _waypoints(d: dict) -> list:
+    return [(d[k]["lng"], d[k]["lat"]) for k in ("currentLocation", "pickupLocation", "dropoffLocation")]
+
+
+def plan_trip_payload(d: dict, route: dict = None) -> dict:
+    """Plan one trip; `route` may be passed in when the caller already fetched it."""
+    if route is None:
+        route = osrm_route(_waypoints(d))
+    plan, interrupts = _plan_interrupts(d, route)
+    _resolve_pois(interrupts)
+    return _build_payload(d, route, plan, interrupts)
+
+
+def rank_origins(candidates: List[dict], pickup: dict) -> List[dict]:
+    """
+    Candidate start locations ordered by driving time to the pickup, from one
+    OSRM table call: [{"index", "duration_s", "distance_m"}]; unreachable last.
+    """
+    table = osrm_table([(c["lng"], c["lat"]) for c in candidates], [(pickup["lng"], pickup["lat"])])
+    ranked = [
+        {"index": i, "duration_s": dur[0], "distance_m": dist[0]}
+        for i, (dur, dist) in enumerate(zip(table["durations"], table["distances"]))
+    ]
+    ranked.sort(key=lambda r: (r["duration_s"] is None, r["duration_s"] or 0))
+    return ranked
+
+
+def iter_plan_batch(items: List[dict], chunk: int = 50) -> Iterator[list]:
+    """
+    Plan many validated trip requests, yielding lists of (index, route_key,
+    payload, error) as they finish (at most `chunk` per list, never waiting to
+    fill one). Requests whose waypoints map to the same OSRM route share one
+    route fetch; fetches and plans run on the shared bounded batch pool.
+    """
+    if not items:
+        return
+    groups = {}
+    for i, d in enumerate(items):
+        groups.setdefault(route_key(_waypoints(d)), []).append(i)
+
+    pool = _get_batch_pool()
+    results = queue.Queue()
+
+    def on_planned(i, key, fut):
+        try:
+            results.put((i, key, fut.result(), None))
+        except Exception as exc:
+            results.put((i, key, None, exc))
+
+    def on_routed(key, fut):
+        try:
+            route = fut.result()
+        except Exception as exc:
+            for i in groups[key]:
+                results.put((i, key, None, exc))
+            return
+        for i in groups[key]:
+            pool.submit(plan_trip_payload, items[i], route).add_done_callback(partial(on_planned, i, key))
+
+    for key, indexes in groups.items():
+        pool.submit(osrm_route, _waypoints(items[indexes[0]])).add_done_callback(partial(on_routed, key))
+
+    remaining = len(items)
+    while remaining:
+        ready = [results.get()]
+        while len(ready) < min(chunk, remaining):
+            try:
+                ready.append(results.get_nowait())
+            except queue.Empty:
+                break
+        remaining -= len(ready)
+        yield ready
+
+
+async def aplan_trip_payload(d: dict) -> dict:
+    route = await aosrm_route(_waypoints(d))
+    plan, interrupts = _plan_interrupts(d, route)
+    await _aresolve_pois(interrupts)
+    return _build_payload(d, route, plan, interrupts)
+
+
+def _plan_interrupts(d: dict, route: dict) -> tuple:
+    """Run the HOS engine over the route; returns (plan, interrupts) with POIs not yet resolved."""
+    cur, pick, drop = _waypoints(d)
+
+    # exact per-segment time/distance from OSRM annotations (haversine fallback)
+    timeline = route_timeline(route, waypoints=(cur, pick, drop))
+    fuel_every = hos.FUEL_EVERY_M
+    fuel_targets = [fuel_every * k for k in range(1, int(timeline.total_m // fuel_every) + 1)]
+    plan = hos.simulate(
+        route["duration_s"],
+        _parse_start(d["startTimeIso"]),
+        cycle_used_h=d["currentCycleUsedHours"],
+        pickup_drive_s=timeline.leg_end_s[0],
+        fuel_drive_s=timeline.time_at_distance(fuel_targets).tolist() if fuel_targets else (),
     )
 
-    # ---- Convert driving-progress to wall-clock ETA (add offsets of prior non-driving)
-    interrupts.sort(key=lambda x: x["drive_s"])
-    non_drive_offset = 0  # seconds accumulated from prior ONDUTY/OFF events
+    interrupts = []
+    for ev in plan.events:
+        it = {"name": ev.note, "type": ev.type, "drive_s": ev.drive_s, "dur_min": ev.duration_min, "start": ev.start}
+        if ev.type == "pickup":
+            it["coord"] = {"lat": pick[1], "lng": pick[0]}
+        elif ev.type == "dropoff":
+            it["coord"] = {"lat": drop[1], "lng": drop[0]}
+        elif ev.type in ("fuel", "rest"):
+            it["poi_kind"] = ev.type
+        interrupts.append(it)
+
+    # Place every along-route stop by driving time with one batched lookup
+    placed = [it for it in interrupts if "coord" not in it]
+    if placed:
+        lats, lngs = timeline.positions_at_time([it["drive_s"] for it in placed])
+        for it, lat, lng in zip(placed, lats.tolist(), lngs.tolist()):
+            it["coord"] = {"lat": lat, "lng": lng}
+
+    return plan, interrupts
+
+
+def _build_payload(d: dict, route: dict, plan: hos.HosPlan, interrupts: list) -> dict:
+    cur = (d["currentLocation"]["lng"], d["currentLocation"]["lat"])
+
+    cur_name = d["currentLocation"].get("name", "") or ""
+    pick_name = d["pickupLocation"].get("name", "") or ""
+    drop_name = d["dropoffLocation"].get("name", "") or ""
+
+    # interrupts come out of the engine in wall-clock order with their start times
     stops = []
-    for i, it in enumerate(interrupts):
-        eta = start_dt + timedelta(seconds=it["drive_s"] + non_drive_offset)
+    for it in interrupts:
         stop = {
             "id": _id(),
             "type": it["type"],
             "coord": it["coord"],
-            "etaIso": eta.isoformat(),
+            "etaIso": it["start"].isoformat(),
             "durationMin": it["dur_min"],
             "note": it["name"],
         }
@@ -292,9 +360,6 @@ def plan_trip_payload(d: dict) -> dict:
             stop["poi"] = it["poi"]
         stops.append(stop)
 
-        # Add offset for all except the final "dropoff" (we still need its duration in ELD)
-        non_drive_offset += it["dur_min"] * 60
-
     stops.insert(
         0,
         {
@@ -307,95 +372,34 @@ def plan_trip_payload(d: dict) -> dict:
         },
     )
 
-    # ---- Build ELD segments (DRIVING/ONDUTY/OFF) from start to end
-    # We create gaps as DRIVING between events, and convert each event to ONDUTY/OFF.
+    # ---- ELD segments (DRIVING/ONDUTY/OFF) straight from the simulation
     def iso(dt):
         return dt.isoformat().replace("+00:00", "Z") if dt.tzinfo else dt.isoformat() + "Z"
 
     segments = []
-    cursor = start_dt  # current wall-clock pointer
-    driven_so_far_s = 0.0
-
-    def add_seg(s, e, status, label=None):
-        if e <= s:
-            return
-        seg = {"startIso": iso(s), "endIso": iso(e), "status": status}
-        if label:
-            seg["label"] = label
-        segments.append(seg)
-
-    # Map event type to status
-    def event_status(t):
-        if t == "rest":
-            return "OFF"
-        return "ONDUTY"  # pickup, break, fuel, dropoff
-
-    for ev in stops:
-        ev_start = datetime.fromisoformat(ev["etaIso"])
-        ev_end = ev_start + timedelta(minutes=ev["durationMin"])
-        # Fill DRIVING from cursor until event start, but only up to the point we still have driving left.
-        # Driving is total_drive_s distributed across the wall clock with interruptions inserted.
-        # Compute theoretical driving left to place.
-        if driven_so_far_s < total_drive_s and ev_start > cursor:
-            # we can place up to (total_drive_s - driven_so_far_s) between cursor and ev_start
-            gap_s = (ev_start - cursor).total_seconds()
-            place_s = min(gap_s, total_drive_s - driven_so_far_s)
-            if place_s > 0:
-                add_seg(cursor, cursor + timedelta(seconds=place_s), "DRIVING")
-                cursor += timedelta(seconds=place_s)
-                driven_so_far_s += place_s
-        # Now place the event as ONDUTY/OFF
-        if ev_end > cursor:
-            add_seg(
-                cursor,
-                ev_end,
-                event_status(ev["type"]),
-                (
-                    "Break 30m"
-                    if ev["type"] == "break"
-                    else (
-                        "Fuel 20m"
-                        if ev["type"] == "fuel"
-                        else (
-                            "Pickup"
-                            if ev["type"] == "pickup"
-                            else "Dropoff" if ev["type"] == "dropoff" else "10h rest" if ev["type"] == "rest" else None
-                        )
-                    )
-                ),
-            )
-            cursor = ev_end
-
-    # If any residual driving remains after last event (edge-case), add it
-    if driven_so_far_s < total_drive_s:
-        rem_s = total_drive_s - driven_so_far_s
-        add_seg(cursor, cursor + timedelta(seconds=rem_s), "DRIVING")
-        cursor += timedelta(seconds=rem_s)
-        driven_so_far_s += rem_s
+    for seg in plan.segments:
+        out = {"startIso": iso(seg.start), "endIso": iso(seg.end), "status": seg.status}
+        if seg.label:
+            out["label"] = seg.label
+        segments.append(out)
 
     # ---- Clip to 24h buckets
     dayBuckets = _clip_segments_to_days(segments)
 
-    # ---- Stats (match your format)
-    total_drive_h = round(total_drive_s / 3600.0, 2)
-    duty_hours_total = round(total_drive_h + (PICKUP_DURATION_MIN + DROPOFF_DURATION_MIN) / 60.0, 2)
-    off_hours_total = 10.0 if (total_drive_s / 3600.0) >= DAILY_DRIVE_CAP_H else 0.0
-    fuel_stops = 1 if total_miles >= FUEL_EVERY_MILES else 0
-
     resp = {
         "route": {k: route[k] for k in ("geometry", "distance_m", "duration_s", "bbox")},
-        "stops": sorted(stops, key=lambda s: s["etaIso"]),
+        "stops": stops,
         "places": {
             "current": {"name": cur_name, "lat": d["currentLocation"]["lat"], "lng": d["currentLocation"]["lng"]},
             "pickup": {"name": pick_name, "lat": d["pickupLocation"]["lat"], "lng": d["pickupLocation"]["lng"]},
             "dropoff": {"name": drop_name, "lat": d["dropoffLocation"]["lat"], "lng": d["dropoffLocation"]["lng"]},
         },
         "stats": {
-            "drive_hours_total": total_drive_h,
-            "duty_hours_total": duty_hours_total,
-            "off_hours_total": off_hours_total,
-            "fuel_stops": fuel_stops,
-            "cycle_hours_used_after": d["currentCycleUsedHours"] + total_drive_h,
+            "drive_hours_total": round(plan.drive_s / 3600.0, 2),
+            "duty_hours_total": round((plan.drive_s + plan.on_duty_s) / 3600.0, 2),
+            "off_hours_total": round(plan.off_duty_s / 3600.0, 2),
+            "fuel_stops": plan.fuel_stops,
+            "cycle_hours_used_after": round(plan.cycle_used_s / 3600.0, 2),
         },
         "dayBuckets": dayBuckets,
     }
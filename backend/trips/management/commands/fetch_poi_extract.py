@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services.http_client import request
+from trips.services.overpass import OVERPASS, extract_query
+from trips.services.poi_index import PoiIndex
+
+
+class Command(BaseCommand):
+    help = "Download fuel/rest POIs for a bbox from Overpass into a local extract file (see POI_EXTRACT_FILES)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bbox", required=True, help="south,west,north,east")
+        parser.add_argument("--out", required=True, help="path of the JSON extract to write")
+        parser.add_argument("--timeout", type=int, default=180)
+
+    def handle(self, *args, **opts):
+        try:
+            south, west, north, east = (float(v) for v in opts["bbox"].split(","))
+        except ValueError:
+            raise CommandError("--bbox must be south,west,north,east")
+        if south >= north or west >= east:
+            raise CommandError("--bbox must be south,west,north,east")
+
+        q = extract_query(south, west, north, east, timeout=opts["timeout"])
+        r = request("POST", OVERPASS, data={"data": q}, timeout=opts["timeout"] + 30)
+        if r.status_code != 200:
+            raise CommandError(f"Overpass returned HTTP {r.status_code}")
+
+        data = r.json()
+        data["bbox"] = [south, west, north, east]
+        count = PoiIndex().load_overpass_json(data)
+        with open(opts["out"], "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} POIs to {opts['out']}"))
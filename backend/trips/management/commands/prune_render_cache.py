@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from trips.services import render_cache
+
+
+class Command(BaseCommand):
+    help = "Evict rendered log pages from the render cache by age and total size."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-bytes", type=int, default=None, help="Size budget (default RENDER_CACHE_MAX_BYTES)")
+        parser.add_argument(
+            "--max-age", type=float, default=None, help="Seconds since last use (default RENDER_CACHE_MAX_AGE_S)"
+        )
+
+    def handle(self, *args, **opts):
+        removed, freed = render_cache.prune(max_bytes=opts["max_bytes"], max_age_s=opts["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} cached file(s), {freed} bytes"))
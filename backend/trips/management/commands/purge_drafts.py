@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from trips.services import drafts
+
+
+class Command(BaseCommand):
+    help = "Delete unlogged trip drafts past their TTL and route geometries no longer referenced."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=None, help="Draft age in seconds (default TRIP_DRAFT_TTL_S)")
+        parser.add_argument("--batch", type=int, default=None, help="Rows per DELETE (default TRIP_DRAFT_PURGE_BATCH)")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+
+    def handle(self, *args, **opts):
+        if opts["dry_run"]:
+            n_drafts = drafts.expired_drafts(opts["ttl"]).count()
+            n_geoms = drafts.orphan_geometries(opts["ttl"]).count()
+            self.stdout.write(f"Would remove {n_drafts} draft(s) and at least {n_geoms} route geometr(ies)")
+            return
+        n_drafts, n_geoms = drafts.purge(ttl_s=opts["ttl"], batch=opts["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {n_drafts} draft(s), {n_geoms} route geometr(ies)"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from trips.services.jobs import drain, requeue_stale, worker_id
+
+
+class Command(BaseCommand):
+    help = "Process queued RenderJob rows (daily log rendering) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **opts):
+        worker = worker_id()
+        self.stdout.write(f"render worker {worker} started")
+        while True:
+            close_old_connections()
+            recovered = requeue_stale()
+            if recovered:
+                self.stdout.write(f"recovered {recovered} stale job(s)")
+            ran = drain(worker)
+            if ran:
+                self.stdout.write(f"rendered {ran} job(s)")
+            if opts["once"]:
+                return
+            if not ran:
+                time.sleep(opts["poll"])
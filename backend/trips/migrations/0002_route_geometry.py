@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:57
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RouteGeometry",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("encoded", models.TextField()),
+                ("precision", models.PositiveSmallIntegerField(default=6)),
+                ("num_points", models.PositiveIntegerField(default=0)),
+                ("bbox", models.JSONField(blank=True, default=list)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="trip",
+            name="route_geometry",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="trips",
+                to="trips.routegeometry",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tripcalcdraft",
+            name="route_geometry",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="drafts",
+                to="trips.routegeometry",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0002_route_geometry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="routegeometry",
+            name="levels",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0004_render_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripfile",
+            name="checksum",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="tripfile",
+            name="size",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="tripfile",
+            name="fmt",
+            field=models.CharField(
+                choices=[
+                    ("pdf", "PDF"),
+                    ("png", "PNG"),
+                    ("html", "HTML"),
+                    ("combined", "Combined PDF"),
+                    ("pagemap", "Page map"),
+                ],
+                max_length=10,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tripfile",
+            constraint=models.UniqueConstraint(
+                fields=("trip", "fmt", "page_index"), name="tripfile_unique_page"
+            ),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# frozen copy of trips.services.summary.summary_fields as of this migration
+def _name(places, key):
+    return ((places.get(key) or {}).get("name") or "")[:255]
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def summary_fields(calc):
+    calc = calc or {}
+    places = calc.get("places") or {}
+    route = calc.get("route") or {}
+    stats = calc.get("stats") or {}
+    return {
+        "current_location": _name(places, "current"),
+        "pickup_location": _name(places, "pickup"),
+        "dropoff_location": _name(places, "dropoff"),
+        "distance_m": _number(route.get("distance_m")),
+        "duration_s": _number(route.get("duration_s")),
+        "cycle_hours_used_after": _number(stats.get("cycle_hours_used_after")),
+    }
+
+
+def backfill_summaries(apps, schema_editor):
+    Trip = apps.get_model("trips", "Trip")
+    TripSummary = apps.get_model("trips", "TripSummary")
+    batch = []
+    for trip in Trip.objects.only(
+        "id", "user_id", "created_at", "calc_payload"
+    ).iterator(chunk_size=500):
+        batch.append(
+            TripSummary(
+                trip_id=trip.id,
+                user_id=trip.user_id,
+                created_at=trip.created_at,
+                **summary_fields(trip.calc_payload)
+            )
+        )
+        if len(batch) >= 500:
+            TripSummary.objects.bulk_create(batch)
+            batch = []
+    TripSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0005_trip_file_catalog"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripSummary",
+            fields=[
+                (
+                    "trip",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="trips.trip",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "current_location",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                (
+                    "pickup_location",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                (
+                    "dropoff_location",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("distance_m", models.FloatField(blank=True, null=True)),
+                ("duration_s", models.FloatField(blank=True, null=True)),
+                ("cycle_hours_used_after", models.FloatField(blank=True, null=True)),
+                ("status", models.CharField(default="completed", max_length=20)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created_at"],
+                        name="trips_trips_user_id_d5f31c_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0006_trip_summary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="trip",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="trips_trip_user_id_37522c_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0007_trip_keyset_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tripcalcdraft",
+            index=models.Index(
+                fields=["user", "is_logged", "created_at"],
+                name="trips_tripc_user_id_873f75_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="triplogfile",
+            index=models.Index(
+                fields=["trip", "page_index"], name="trips_tripl_trip_id_99862e_idx"
+            ),
+        ),
+    ]
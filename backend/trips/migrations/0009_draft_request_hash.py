@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0008_hot_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripcalcdraft",
+            name="request_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="tripcalcdraft",
+            index=models.Index(
+                fields=["user", "request_hash", "created_at"],
+                name="trips_tripc_user_id_da859d_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tripcalcdraft",
+            index=models.Index(
+                fields=["is_logged", "created_at"],
+                name="trips_tripc_is_logg_8f5f8f_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0009_draft_request_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="routegeometry",
+            name="last_used_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+    ]
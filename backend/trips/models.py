@@ -4,39 +4,112 @@ from django.db import models
 from django.utils import timezone
 
 
+class RouteGeometry(models.Model):
+    """
+    Route LineString stored once as an encoded polyline; drafts and trips
+    reference it instead of embedding the coordinate list in their payloads.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of (precision, encoded)
+    encoded = models.TextField()
+    precision = models.PositiveSmallIntegerField(default=6)
+    num_points = models.PositiveIntegerField(default=0)
+    bbox = models.JSONField(default=list, blank=True)
+    levels = models.JSONField(default=dict, blank=True)  # resolution name -> encoded simplified polyline
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)  # bumped whenever a calculate reuses it
+
+
 class TripCalcDraft(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="trip_calc_drafts")
     payload = models.JSONField()
+    route_geometry = models.ForeignKey(
+        RouteGeometry, null=True, blank=True, on_delete=models.SET_NULL, related_name="drafts"
+    )
     created_at = models.DateTimeField(default=timezone.now)
     is_logged = models.BooleanField(default=False)
+    request_hash = models.CharField(max_length=64, blank=True, default="")  # sha256 of the validated request
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "is_logged", "created_at"]),
+            models.Index(fields=["user", "request_hash", "created_at"]),
+            models.Index(fields=["is_logged", "created_at"]),
+        ]
 
 
 class Trip(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     calc_payload = models.JSONField()
+    route_geometry = models.ForeignKey(
+        RouteGeometry, null=True, blank=True, on_delete=models.SET_NULL, related_name="trips"
+    )
     extras = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a user's trips on (created_at, id)
+            models.Index(fields=["user", "created_at", "id"]),
+        ]
+
+
+class TripSummary(models.Model):
+    """
+    Denormalised figures of a trip's calc_payload (see services/summary.py),
+    written when the trip is created, so the dashboard and trip lists never
+    load payloads. Goes away with the trip.
+    """
+
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()  # copy of trip.created_at
+    current_location = models.CharField(max_length=255, blank=True, default="")
+    pickup_location = models.CharField(max_length=255, blank=True, default="")
+    dropoff_location = models.CharField(max_length=255, blank=True, default="")
+    distance_m = models.FloatField(null=True, blank=True)
+    duration_s = models.FloatField(null=True, blank=True)
+    cycle_hours_used_after = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=20, default="completed")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"]),
+        ]
+
 
 class TripFile(models.Model):
+    """
+    Catalog of every file rendered for a trip (see services/catalog.py); one
+    row per (trip, fmt, page_index), so downloads and deletes never walk disk.
+    """
+
     FORMAT_CHOICES = [
         ("pdf", "PDF"),
         ("png", "PNG"),
         ("html", "HTML"),
+        ("combined", "Combined PDF"),
+        ("pagemap", "Page map"),
     ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="files")
     page_index = models.PositiveIntegerField()  # 0-based
     fmt = models.CharField(max_length=10, choices=FORMAT_CHOICES)
     storage_path = models.CharField(max_length=512)  # path within Django storage
+    size = models.PositiveBigIntegerField(default=0)
+    checksum = models.CharField(max_length=64, blank=True, default="")  # sha256 of the content
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["trip", "fmt", "page_index"]),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=["trip", "fmt", "page_index"], name="tripfile_unique_page"),
+        ]
         ordering = ["page_index"]
 
 
@@ -52,3 +125,43 @@ class TripLogFile(models.Model):
     pdf_file = models.FileField(upload_to="trips/%Y/%m/%d/pdf/", null=True, blank=True)
     png_file = models.FileField(upload_to="trips/%Y/%m/%d/png/", null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trip", "page_index"]),
+        ]
+
+
+class RenderJob(models.Model):
+    """
+    Persisted request to render a trip's daily logs (render_and_store_logs).
+    Workers claim queued rows with a conditional UPDATE, so any number of
+    in-process pools and `run_render_worker` processes can share the table.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="render_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    result = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
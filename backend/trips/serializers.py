@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import TripCalcDraft, Trip, TripLogFile
+from .models import RenderJob, TripCalcDraft, Trip, TripLogFile
 
 
 class LatLngSer(serializers.Serializer):
@@ -16,6 +17,22 @@ class TripCalcRequestSer(serializers.Serializer):
     startTimeIso = serializers.DateTimeField()
 
 
+class BestOriginRequestSer(serializers.Serializer):
+    """TripCalcRequestSer with candidate start locations in place of currentLocation."""
+
+    candidates = LatLngSer(many=True, allow_empty=False)
+    pickupLocation = LatLngSer()
+    dropoffLocation = LatLngSer()
+    currentCycleUsedHours = serializers.IntegerField(min_value=0, max_value=70)
+    startTimeIso = serializers.DateTimeField()
+
+    def validate_candidates(self, value):
+        limit = getattr(settings, "BEST_ORIGIN_MAX_CANDIDATES", 200)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"at most {limit} candidates")
+        return value
+
+
 class StopSer(serializers.Serializer):
     id = serializers.CharField()
     type = serializers.ChoiceField(choices=["pickup", "break", "fuel", "rest", "dropoff"])
@@ -107,6 +124,43 @@ class TripSer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "calc_payload", "files"]
 
 
+class TripListSer(serializers.ModelSerializer):
+    """
+    Trip list rows. calc_payload is projected from TripSummary (select_related
+    "summary") onto the keys lists render; the full payload is only loaded by
+    the detail endpoint.
+    """
+
+    calc_payload = serializers.SerializerMethodField()
+    files = TripLogFileSer(many=True, source="logs", read_only=True)
+
+    class Meta:
+        model = Trip
+        fields = ["id", "created_at", "calc_payload", "files"]
+        read_only_fields = fields
+
+    def get_calc_payload(self, obj):
+        summary = getattr(obj, "summary", None)
+        if summary is None:
+            return None
+        return {
+            "route": {"distance_m": summary.distance_m, "duration_s": summary.duration_s},
+            "places": {
+                "current": {"name": summary.current_location},
+                "pickup": {"name": summary.pickup_location},
+                "dropoff": {"name": summary.dropoff_location},
+            },
+            "stats": {"cycle_hours_used_after": summary.cycle_hours_used_after},
+        }
+
+
+class RenderJobSer(serializers.ModelSerializer):
+    class Meta:
+        model = RenderJob
+        fields = ["id", "status", "attempts", "error", "created_at", "started_at", "finished_at"]
+        read_only_fields = fields
+
+
 class LogTripRequestSer(serializers.Serializer):
     draft_id = serializers.UUIDField()
 
@@ -0,0 +1,197 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+def make_key(*parts: Any) -> str:
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def approx_size(value: Any) -> int:
+    """Rough in-memory size of a JSON-like value (dicts, lists, strings, numbers), in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(v) for v in value)
+    return size
+
+
+class TieredCache:
+    """
+    Per-process LRU in front of a shared Django cache alias.
+
+    The shared tier owns TTL and size-based eviction (TIMEOUT / MAX_ENTRIES
+    on the alias); the LRU only saves the unpickle + disk/DB read for hot keys.
+    It is bounded by entries (lru_size) and, when lru_bytes is set, by the
+    approximate bytes of its values as measured by `sizeof`; local entries
+    also expire after `ttl`. Cached values are shared between callers and must
+    be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        alias: str = "default",
+        lru_size: int = 256,
+        ttl: Optional[int] = None,
+        lru_bytes: int = 0,
+        sizeof: Callable[[Any], int] = approx_size,
+    ):
+        self.prefix = prefix
+        self.alias = alias
+        self.lru_size = max(0, int(lru_size))
+        self.lru_bytes = max(0, int(lru_bytes))
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _shared(self):
+        return caches[self.alias]
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._lru.pop(key)
+        self._bytes -= size
+
+    def _remember(self, key: str, value: Any) -> None:
+        if not self.lru_size:
+            return
+        size = self.sizeof(value) if self.lru_bytes else 0
+        if self.lru_bytes and size > self.lru_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._lru:
+                self._drop(key)
+            self._lru[key] = (value, size, expires)
+            self._bytes += size
+            while len(self._lru) > self.lru_size or (self.lru_bytes and self._bytes > self.lru_bytes):
+                self._drop(next(iter(self._lru)))
+
+    def _local_get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return _MISSING
+            value, _, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._drop(key)
+                return _MISSING
+            self._lru.move_to_end(key)
+            self.hits_local += 1
+            return value
+
+    def _shared_result(self, key: str, value: Any, default: Any) -> Any:
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits_shared += 1
+        if value is _MISSING:
+            return default
+        self._remember(key, value)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._local_get(key)
+        if value is not _MISSING:
+            return value
+        try:
+            value = self._shared().get(self._key(key), _MISSING)
+        except Exception:
+            value = _MISSING
+        return self._shared_result(key, value, default)
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        value = self._local_get(key)
+        if value is not _MISSING:
+            return value
+        try:
+            value = await self._shared().aget(self._key(key), _MISSING)
+        except Exception:
+            value = _MISSING
+        return self._shared_result(key, value, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        kwargs = {} if self.ttl is None else {"timeout": self.ttl}
+        try:
+            self._shared().set(self._key(key), value, **kwargs)
+        except Exception:
+            # the shared tier is an optimisation; never fail the request over it
+            pass
+
+    async def aset(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        kwargs = {} if self.ttl is None else {"timeout": self.ttl}
+        try:
+            await self._shared().aset(self._key(key), value, **kwargs)
+        except Exception:
+            pass
+
+    def get_many(self, keys) -> Dict[str, Any]:
+        """{key: value} for the keys found in either tier (one shared round trip)."""
+        found, missing = {}, []
+        for key in keys:
+            value = self._local_get(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        try:
+            shared = self._shared().get_many([self._key(k) for k in missing])
+        except Exception:
+            shared = {}
+        for key in missing:
+            value = self._shared_result(key, shared.get(self._key(key), _MISSING), _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    def set_many(self, mapping: Dict[str, Any]) -> None:
+        for key, value in mapping.items():
+            self._remember(key, value)
+        kwargs = {} if self.ttl is None else {"timeout": self.ttl}
+        try:
+            self._shared().set_many({self._key(k): v for k, v in mapping.items()}, **kwargs)
+        except Exception:
+            pass
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits_local, hits_shared, misses = self.hits_local, self.hits_shared, self.misses
+            local_size, local_bytes = len(self._lru), self._bytes
+        lookups = hits_local + hits_shared + misses
+        hits = hits_local + hits_shared
+        return {
+            "prefix": self.prefix,
+            "hits_local": hits_local,
+            "hits_shared": hits_shared,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "local_size": local_size,
+            "local_bytes": local_bytes,
+        }
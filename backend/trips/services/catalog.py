@@ -0,0 +1,126 @@
+"""
+File catalog for rendered logs: TripFile rows (one per artefact, with size
+and sha256) and TripLogFile rows (one per day, for the API). Written in bulk
+after each render, so downloads, deletes and storage accounting are index
+lookups instead of directory walks. storage_path is relative to MEDIA_ROOT.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Trip, TripFile, TripLogFile
+
+CHUNK = 64 * 1024
+
+
+def checksum(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def storage_key(path: str) -> str:
+    return os.path.relpath(path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, "/")
+
+
+def abs_path(key: str) -> str:
+    return os.path.join(os.path.abspath(settings.MEDIA_ROOT), *key.split("/"))
+
+
+def _row(trip: Trip, fmt: str, page_index: int, path: str) -> TripFile:
+    return TripFile(
+        trip=trip,
+        fmt=fmt,
+        page_index=page_index,
+        storage_path=storage_key(path),
+        size=os.path.getsize(path),
+        checksum=checksum(path),
+    )
+
+
+def _remove(paths: Iterable[str]) -> None:
+    dirs = set()
+    for path in paths:
+        dirs.add(os.path.dirname(path))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    # the logs folder, then the trip folder, once nothing else is left in them
+    for d in sorted(dirs, key=len, reverse=True):
+        for folder in (d, os.path.dirname(d)):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+
+
+def record_render(trip: Trip, days: Sequence[Dict[str, Any]], extra: Iterable[Tuple[str, str]] = ()) -> bool:
+    """
+    Replace the trip's catalog with the output of one render: `days` are the
+    per-day results of render_and_store_logs (paths that were not written, e.g.
+    book-mode PDFs, are skipped), `extra` (fmt, path) trip-level files. If the
+    trip was deleted while it rendered, the new files are removed instead and
+    False is returned.
+    """
+    rows, logs = [], []
+    for index, day in enumerate(days):
+        keys = {}
+        for fmt in ("html", "pdf", "png"):
+            path = day.get(f"{fmt}_path")
+            if path and os.path.exists(path):
+                rows.append(_row(trip, fmt, index, path))
+                keys[fmt] = rows[-1].storage_path
+        log = TripLogFile(trip=trip, page_index=index)
+        log.html_file.name = keys.get("html")
+        log.pdf_file.name = keys.get("pdf")
+        log.png_file.name = keys.get("png")
+        logs.append(log)
+    for fmt, path in extra:
+        if os.path.exists(path):
+            rows.append(_row(trip, fmt, 0, path))
+
+    with transaction.atomic():
+        # the row lock orders this against a concurrent delete (see TripRetrieveDestroyView.delete)
+        if not Trip.objects.select_for_update().filter(pk=trip.pk).exists():
+            _remove(abs_path(row.storage_path) for row in rows)
+            return False
+        TripFile.objects.filter(trip=trip).delete()
+        TripLogFile.objects.filter(trip=trip).delete()
+        TripFile.objects.bulk_create(rows)
+        TripLogFile.objects.bulk_create(logs)
+    return True
+
+
+def record_pages(trip: Trip, fmt: str, pages: Sequence[Tuple[int, str]]) -> None:
+    """Add files produced after the render (book-mode PDFs cut on demand); concurrent adds are harmless."""
+    rows = [_row(trip, fmt, index, path) for index, path in pages]
+    with transaction.atomic():
+        TripFile.objects.bulk_create(rows, ignore_conflicts=True)
+        if fmt in ("html", "pdf", "png"):
+            for row in rows:
+                TripLogFile.objects.filter(trip=trip, page_index=row.page_index).update(
+                    **{f"{fmt}_file": row.storage_path}
+                )
+
+
+def files(trip: Trip, fmt: str) -> List[TripFile]:
+    return list(TripFile.objects.filter(trip=trip, fmt=fmt).order_by("page_index"))
+
+
+def delete_files(trip: Trip) -> bool:
+    """
+    Remove every catalogued file of a trip and its rows. Returns False when the
+    trip has no catalog (rendered before it existed), so callers can fall back.
+    """
+    keys = list(TripFile.objects.filter(trip=trip).values_list("storage_path", flat=True))
+    _remove(abs_path(key) for key in keys)
+    TripFile.objects.filter(trip=trip).delete()
+    TripLogFile.objects.filter(trip=trip).delete()
+    return bool(keys)
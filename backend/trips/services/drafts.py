@@ -0,0 +1,112 @@
+"""
+TripCalcDraft lifecycle: drafts carry a hash of the request that produced them
+so an identical recalculation within TRIP_DRAFT_REUSE_S returns the existing
+draft instead of planning and inserting a copy, and unlogged drafts older than
+TRIP_DRAFT_TTL_S are deleted in bounded batches (`manage.py purge_drafts`),
+together with route geometries nothing references any more.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ..models import RouteGeometry, Trip, TripCalcDraft
+
+
+def request_hash(data: Dict[str, Any]) -> str:
+    """sha256 of the validated request in canonical JSON (sorted keys, ISO datetimes)."""
+    raw = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _reusable(user):
+    window = getattr(settings, "TRIP_DRAFT_REUSE_S", 600)
+    return TripCalcDraft.objects.filter(
+        user=user,
+        is_logged=False,
+        route_geometry__isnull=False,
+        created_at__gte=timezone.now() - timedelta(seconds=window),
+    ).order_by("-created_at")
+
+
+def reusable_draft(user, key: str) -> Optional[TripCalcDraft]:
+    """
+    The user's newest unlogged draft for the same request, if it is recent
+    enough to reuse. Best effort: two identical requests racing each other may
+    still both plan and insert.
+    """
+    if getattr(settings, "TRIP_DRAFT_REUSE_S", 600) <= 0:
+        return None
+    return _reusable(user).filter(request_hash=key).select_related("route_geometry").first()
+
+
+async def areusable_draft(user, key: str) -> Optional[TripCalcDraft]:
+    if getattr(settings, "TRIP_DRAFT_REUSE_S", 600) <= 0:
+        return None
+    return await _reusable(user).filter(request_hash=key).select_related("route_geometry").afirst()
+
+
+def reusable_drafts(user, keys: Iterable[str]) -> Dict[str, TripCalcDraft]:
+    """reusable_draft for many request hashes in one query: {hash: newest reusable draft}."""
+    keys = list(keys)
+    if getattr(settings, "TRIP_DRAFT_REUSE_S", 600) <= 0 or not keys:
+        return {}
+    found = {}
+    for draft in _reusable(user).filter(request_hash__in=keys):
+        found.setdefault(draft.request_hash, draft)
+    return found
+
+
+def _delete_in_batches(qs, batch: int) -> int:
+    """
+    Delete the rows of `qs` `batch` at a time. Each batch is picked under
+    select_for_update in its own transaction, so the filter is re-checked
+    against rows a concurrent writer may have just touched.
+    """
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(qs.select_for_update().values_list("pk", flat=True)[:batch])
+            if not ids:
+                return deleted
+            deleted += qs.model.objects.filter(pk__in=ids).delete()[1].get(qs.model._meta.label, 0)
+
+
+def expired_drafts(ttl_s: Optional[int] = None):
+    ttl_s = getattr(settings, "TRIP_DRAFT_TTL_S", 7 * 24 * 3600) if ttl_s is None else ttl_s
+    return TripCalcDraft.objects.filter(is_logged=False, created_at__lt=timezone.now() - timedelta(seconds=ttl_s))
+
+
+def orphan_geometries(ttl_s: Optional[int] = None):
+    """
+    Route geometries no draft or trip points at and no calculate has used for
+    the whole TTL. Rows are shared by digest, so age alone says nothing: a new
+    calculate can get back an old row. store_route_geometry bumps last_used_at
+    before returning a reused row, and the purge re-checks this filter under a
+    row lock, so a row handed out just now is never deleted before its draft is
+    inserted.
+    """
+    ttl_s = getattr(settings, "TRIP_DRAFT_TTL_S", 7 * 24 * 3600) if ttl_s is None else ttl_s
+    return RouteGeometry.objects.filter(last_used_at__lt=timezone.now() - timedelta(seconds=ttl_s)).filter(
+        ~Exists(TripCalcDraft.objects.filter(route_geometry=OuterRef("pk"))),
+        ~Exists(Trip.objects.filter(route_geometry=OuterRef("pk"))),
+    )
+
+
+def purge(ttl_s: Optional[int] = None, batch: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Delete expired unlogged drafts, then orphaned route geometries, at most
+    `batch` rows per DELETE so no single statement holds locks for long.
+    Returns (drafts deleted, geometries deleted).
+    """
+    batch = batch or getattr(settings, "TRIP_DRAFT_PURGE_BATCH", 1000)
+    drafts = _delete_in_batches(expired_drafts(ttl_s), batch)
+    geometries = _delete_in_batches(orphan_geometries(ttl_s), batch)
+    return drafts, geometries
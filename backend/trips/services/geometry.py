@@ -0,0 +1,244 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_R = 6371000.0
+
+
+def _cumulative_m(coords: np.ndarray) -> np.ndarray:
+    """Cumulative haversine distance (metres) at every vertex of an (n, 2) lng/lat array."""
+    cum = np.zeros(len(coords), dtype=np.float64)
+    if len(coords) < 2:
+        return cum
+    lng = np.radians(coords[:, 0])
+    lat = np.radians(coords[:, 1])
+    dlat = np.diff(lat)
+    dlng = np.diff(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlng / 2) ** 2
+    np.cumsum(2 * EARTH_R * np.arcsin(np.sqrt(np.minimum(a, 1.0))), out=cum[1:])
+    return cum
+
+
+class Polyline:
+    """
+    Route LineString held as a contiguous (n, 2) float64 array of (lng, lat),
+    with cumulative distances computed once so "position at distance d"
+    queries are a searchsorted + lerp, batched over any number of targets.
+    """
+
+    def __init__(self, coords_lnglat: Sequence[Sequence[float]]):
+        self.coords = np.ascontiguousarray(coords_lnglat, dtype=np.float64).reshape(-1, 2)
+        self.cum = _cumulative_m(self.coords)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def total_m(self) -> float:
+        return float(self.cum[-1]) if len(self.cum) else 0.0
+
+    def positions_at(self, distances_m) -> Tuple[np.ndarray, np.ndarray]:
+        """(lats, lngs) at each distance along the line, clamped to its endpoints."""
+        d = np.asarray(distances_m, dtype=np.float64)
+        n = len(self.coords)
+        if n == 0:
+            return np.zeros_like(d), np.zeros_like(d)
+        if n == 1:
+            return np.full_like(d, self.coords[0, 1]), np.full_like(d, self.coords[0, 0])
+        d = np.clip(d, 0.0, self.cum[-1])
+        i = np.clip(np.searchsorted(self.cum, d, side="left"), 1, n - 1)
+        start = self.cum[i - 1]
+        seg = self.cum[i] - start
+        t = np.divide(d - start, seg, out=np.zeros_like(d), where=seg > 0)
+        p0 = self.coords[i - 1]
+        p1 = self.coords[i]
+        lng = p0[..., 0] + t * (p1[..., 0] - p0[..., 0])
+        lat = p0[..., 1] + t * (p1[..., 1] - p0[..., 1])
+        return lat, lng
+
+    def position_at(self, distance_m: float) -> Tuple[float, float]:
+        lat, lng = self.positions_at([distance_m])
+        return float(lat[0]), float(lng[0])
+
+
+class RouteTimeline(Polyline):
+    """
+    Polyline with a driving-time axis: cum_s[i] is the driving time (seconds)
+    to reach vertex i, so time <-> distance <-> position lookups along the
+    route are interpolations over the same vertex arrays.
+    """
+
+    def __init__(self, coords_lnglat, seg_m, seg_s, leg_end_idx):
+        self.coords = np.ascontiguousarray(coords_lnglat, dtype=np.float64).reshape(-1, 2)
+        self.cum = np.concatenate(([0.0], np.cumsum(np.asarray(seg_m, dtype=np.float64))))
+        self.cum_s = np.concatenate(([0.0], np.cumsum(np.asarray(seg_s, dtype=np.float64))))
+        self.leg_end_idx = list(leg_end_idx)
+
+    @property
+    def total_s(self) -> float:
+        return float(self.cum_s[-1]) if len(self.cum_s) else 0.0
+
+    @property
+    def leg_end_s(self) -> List[float]:
+        return [float(self.cum_s[i]) for i in self.leg_end_idx]
+
+    def distance_at_time(self, seconds):
+        return np.interp(seconds, self.cum_s, self.cum)
+
+    def time_at_distance(self, metres):
+        return np.interp(metres, self.cum, self.cum_s)
+
+    def positions_at_time(self, seconds) -> Tuple[np.ndarray, np.ndarray]:
+        return self.positions_at(self.distance_at_time(np.asarray(seconds, dtype=np.float64)))
+
+
+def _annotation_segments(legs, n_segments):
+    """Per-segment (metres, seconds) from OSRM leg annotations, or None if unusable."""
+    seg_m, seg_s, leg_end_idx = [], [], []
+    for leg in legs:
+        ann = leg.get("annotation") or {}
+        dist = ann.get("distance")
+        dur = ann.get("duration")
+        if not dist or not dur or len(dist) != len(dur):
+            return None
+        # annotations omit turn penalties; scale so each leg sums to its reported duration
+        ann_total = float(sum(dur))
+        scale = float(leg.get("duration", ann_total)) / ann_total if ann_total > 0 else 1.0
+        seg_m.extend(dist)
+        seg_s.extend(v * scale for v in dur)
+        leg_end_idx.append(len(seg_m))
+    if len(seg_m) != n_segments:
+        return None
+    return seg_m, seg_s, leg_end_idx
+
+
+def route_timeline(route: dict, waypoints=None) -> RouteTimeline:
+    """
+    Build a RouteTimeline from an osrm_route() result.
+
+    Uses the per-segment distance/duration annotations of each leg when they
+    line up with the overview geometry; otherwise falls back to haversine
+    segment lengths with time spread pro rata, and leg ends at the vertices
+    nearest to the given (lng, lat) waypoints.
+    """
+    coords = (route.get("geometry") or {}).get("coordinates") or []
+    total_s = float(route.get("duration_s") or 0)
+    legs = (route.get("raw") or {}).get("legs") or []
+    n_segments = max(len(coords) - 1, 0)
+
+    parsed = _annotation_segments(legs, n_segments) if legs and n_segments else None
+    if parsed is not None:
+        seg_m, seg_s, leg_end_idx = parsed
+        timeline = RouteTimeline(coords, seg_m, seg_s, leg_end_idx)
+    else:
+        line = Polyline(coords)
+        seg_m = np.diff(line.cum)
+        rate = total_s / line.total_m if line.total_m > 0 else 0.0
+        leg_end_idx = []
+        if waypoints and len(line):
+            for lng, lat in list(waypoints)[1:]:
+                d2 = (line.coords[:, 0] - lng) ** 2 + (line.coords[:, 1] - lat) ** 2
+                leg_end_idx.append(max(int(np.argmin(d2)), leg_end_idx[-1] if leg_end_idx else 0))
+        timeline = RouteTimeline(line.coords, seg_m, seg_m * rate, leg_end_idx or [n_segments])
+
+    # keep the time axis consistent with the integer duration reported to clients
+    if timeline.total_s > 0 and total_s > 0:
+        timeline.cum_s *= total_s / timeline.total_s
+    return timeline
+
+
+def encode_polyline(coords_lnglat, precision: int = 6) -> str:
+    """Google encoded-polyline string ((lat, lng) order) for a sequence of (lng, lat) pairs."""
+    arr = np.asarray(coords_lnglat, dtype=np.float64).reshape(-1, 2)
+    if not len(arr):
+        return ""
+    scaled = np.round(arr[:, ::-1] * (10**precision)).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel().tolist()
+    out = []
+    for v in deltas:
+        v = ~(v << 1) if v < 0 else (v << 1)
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 6) -> List[List[float]]:
+    """Inverse of encode_polyline: list of [lng, lat] pairs."""
+    values = []
+    shift = result = 0
+    for ch in encoded:
+        b = ord(ch) - 63
+        result |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            shift = result = 0
+    if not values:
+        return []
+    latlng = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / float(10**precision)
+    return latlng[:, ::-1].tolist()
+
+
+# Douglas-Peucker tolerances in degrees (planar, as drawn on a web map).
+# "high" (~5 m) is visually lossless at street zoom; "low" suits a country view.
+RESOLUTIONS = {
+    "full": 0.0,
+    "high": 0.00005,
+    "medium": 0.0005,
+    "low": 0.005,
+}
+
+
+def simplify(coords_lnglat, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification; each split step is one vectorised distance pass."""
+    pts = np.asarray(coords_lnglat, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    if tolerance <= 0 or n < 3:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        p = pts[a]
+        dx, dy = pts[b] - p
+        seg = pts[a + 1 : b] - p
+        length = np.hypot(dx, dy)
+        if length > 0:
+            dist = np.abs(dx * seg[:, 1] - dy * seg[:, 0]) / length
+        else:
+            dist = np.hypot(seg[:, 0], seg[:, 1])
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            k = a + 1 + i
+            keep[k] = True
+            stack.append((a, k))
+            stack.append((k, b))
+    return pts[keep]
+
+
+def clip_to_bbox(coords_lnglat, bbox) -> List[List[List[float]]]:
+    """
+    Runs of the line whose segments' envelopes overlap bbox (west, south, east,
+    north); conservative, so segments crossing the box edge are kept whole.
+    """
+    pts = np.asarray(coords_lnglat, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 2:
+        return []
+    west, south, east, north = bbox
+    p0, p1 = pts[:-1], pts[1:]
+    visible = (
+        (np.minimum(p0[:, 0], p1[:, 0]) <= east)
+        & (np.maximum(p0[:, 0], p1[:, 0]) >= west)
+        & (np.minimum(p0[:, 1], p1[:, 1]) <= north)
+        & (np.maximum(p0[:, 1], p1[:, 1]) >= south)
+    )
+    seg = np.flatnonzero(visible)
+    if not len(seg):
+        return []
+    breaks = np.flatnonzero(np.diff(seg) > 1) + 1
+    return [pts[run[0] : run[-1] + 2].tolist() for run in np.split(seg, breaks)]
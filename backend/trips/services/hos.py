@@ -1,89 +1,162 @@
-from math import radians, sin, cos, asin, sqrt
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
 
-# Heuristics / rules for a simple first pass
-AVG_SPEED_KMPH = 88.5  # ~55 mph average
-BREAK_AT_DRIVE_H = 7.5  # take 30-min break before hitting 8h driving
+# Property-carrying driver limits (49 CFR 395.3)
+BREAK_AFTER_DRIVE_S = 8 * 3600  # 30-min break required after 8h cumulative driving
 BREAK_MIN = 30
-FUEL_EVERY_KM = 1609.344  # ~1000 miles
+DRIVE_LIMIT_S = 11 * 3600  # driving per shift
+WINDOW_LIMIT_S = 14 * 3600  # no driving past the 14th hour after coming on duty
+REST_MIN = 10 * 60  # off duty between shifts
+CYCLE_LIMIT_S = 70 * 3600  # on-duty hours in 8 days
+RESTART_MIN = 34 * 60  # off duty that resets the cycle
+
+FUEL_EVERY_M = 1609.344 * 1000  # ~1000 miles
 FUEL_MIN = 20
-DRIVE_LIMIT_H = 11  # 11 hours driving per day
-REST_MIN = 10 * 60  # 10h off-duty
-CYCLE_LIMIT_H = 70  # 70-hour / 8 days
-RESTART_MIN = 34 * 60  # 34h restart if cycle would exceed
-
-
-def _haversine_km(p1, p2):
-    lat1, lon1 = p1[1], p1[0]
-    lat2, lon2 = p2[1], p2[0]
-    R = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    return R * c
-
-
-def _total_km(geometry):
-    coords = geometry.get("coordinates") or []
-    if len(coords) < 2:
-        return 0.0
-    dist = 0.0
-    for i in range(1, len(coords)):
-        dist += _haversine_km(coords[i - 1], coords[i])
-    return dist
-
-
-def plan_stops(route_geom, start_dt, current_cycle_h):
+PICKUP_MIN = 60
+DROPOFF_MIN = 60
+
+_EPS = 1e-6
+
+
+@dataclass
+class HosEvent:
+    """A non-driving activity; drive_s is the driving progress (seconds) where it happens."""
+
+    type: str  # pickup | break | fuel | rest | dropoff
+    drive_s: float
+    start: datetime
+    duration_min: int
+    note: str
+    label: str
+    status: str  # ONDUTY | OFF
+
+
+@dataclass
+class HosSegment:
+    start: datetime
+    end: datetime
+    status: str  # DRIVING | ONDUTY | OFF
+    label: Optional[str] = None
+
+
+@dataclass
+class HosPlan:
+    events: List[HosEvent] = field(default_factory=list)
+    segments: List[HosSegment] = field(default_factory=list)
+    drive_s: float = 0.0
+    on_duty_s: float = 0.0
+    off_duty_s: float = 0.0
+    cycle_used_s: float = 0.0  # on-duty seconds counted against the cycle at the end
+
+    @property
+    def fuel_stops(self) -> int:
+        return sum(1 for e in self.events if e.type == "fuel")
+
+
+class _Driver:
+    """Mutable duty state stepped by simulate()."""
+
+    def __init__(self, start_dt: datetime, cycle_used_s: float):
+        self.plan = HosPlan()
+        self.now = start_dt
+        self.driven = 0.0
+        self.since_break = 0.0
+        self.shift_drive = 0.0
+        self.shift_start = start_dt
+        self.cycle = cycle_used_s
+
+    def _segment(self, end: datetime, status: str, label: Optional[str] = None) -> None:
+        if end <= self.now:
+            return
+        segs = self.plan.segments
+        if segs and segs[-1].status == status and segs[-1].label == label and segs[-1].end == self.now:
+            segs[-1].end = end
+        else:
+            segs.append(HosSegment(self.now, end, status, label))
+        self.now = end
+
+    def drive(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        self._segment(self.now + timedelta(seconds=seconds), "DRIVING")
+        self.driven += seconds
+        self.since_break += seconds
+        self.shift_drive += seconds
+        self.cycle += seconds
+        self.plan.drive_s += seconds
+
+    def stop(self, type_: str, minutes: int, note: str, label: str, status: str) -> None:
+        self.plan.events.append(HosEvent(type_, self.driven, self.now, minutes, note, label, status))
+        seconds = minutes * 60
+        self._segment(self.now + timedelta(seconds=seconds), status, label)
+        if minutes >= BREAK_MIN:
+            # 30 consecutive minutes not driving (on or off duty) satisfies the break
+            self.since_break = 0.0
+        if status == "OFF":
+            self.plan.off_duty_s += seconds
+        else:
+            self.plan.on_duty_s += seconds
+            self.cycle += seconds
+        if type_ == "rest":
+            self.shift_drive = 0.0
+            self.shift_start = self.now
+            if minutes >= RESTART_MIN:
+                self.cycle = 0.0
+
+
+def simulate(
+    total_drive_s: float,
+    start_dt: datetime,
+    cycle_used_h: float = 0.0,
+    pickup_drive_s: Optional[float] = None,
+    fuel_drive_s: Sequence[float] = (),
+) -> HosPlan:
     """
-    Returns a list of stop dicts with:
-    { "type": "break"|"fuel"|"rest",
-      "at_km": float,            # along the route from origin
-      "durationMin": int,
-      "note": str }
+    Step a single driver through a route of `total_drive_s` seconds of driving.
+
+    Each iteration drives until the nearest of: the next scheduled stop
+    (pickup, fuel, dropoff) or the next limit (8h break, 11h driving, 14h
+    window, 70h cycle), then applies that stop or the rest the limit requires.
+    Work is O(events). The driver is assumed to start a fresh shift at
+    start_dt with `cycle_used_h` hours already on the cycle; since per-day
+    history is unknown, hours never roll off the 8-day window and the cycle
+    only resets with a 34-hour restart (conservative).
     """
-    stops = []
-
-    total_km = _total_km(route_geom)
-    if total_km <= 0:
-        return stops
-
-    total_drive_h = total_km / AVG_SPEED_KMPH
-
-    # Optional: plan a 34h restart near the start if cycle is already very high
-    # (simple heuristic — refine later with exact duty simulation)
-    if current_cycle_h >= 60:
-        stops.append(
-            {"type": "rest", "at_km": 0.0, "durationMin": RESTART_MIN, "note": "34-hour restart (cycle near limit)"}
-        )
-        # After restart, cycle resets effectively for planning purposes
-
-    # 30-min break before hitting 8h driving (place at ~7.5h of driving if needed)
-    if total_drive_h > BREAK_AT_DRIVE_H:
-        break_km = BREAK_AT_DRIVE_H * AVG_SPEED_KMPH
-        break_km = min(break_km, max(0.0, total_km - 1e-3))
-        stops.append(
-            {
-                "type": "break",
-                "at_km": break_km,
-                "durationMin": BREAK_MIN,
-                "note": "30-min break (before 8h driving rule)",
-            }
-        )
-
-    # Fuel every ~1000 miles (1609km)
-    km = FUEL_EVERY_KM
-    while km < total_km:
-        stops.append({"type": "fuel", "at_km": km, "durationMin": FUEL_MIN, "note": "Fuel stop (~1000 mi interval)"})
-        km += FUEL_EVERY_KM
-
-    # Daily 10h rest if more than 11h of driving needed
-    if total_drive_h > DRIVE_LIMIT_H:
-        rest_km = DRIVE_LIMIT_H * AVG_SPEED_KMPH
-        rest_km = min(rest_km, max(0.0, total_km - 1e-3))
-        stops.append(
-            {"type": "rest", "at_km": rest_km, "durationMin": REST_MIN, "note": "10h off-duty (11h driving/day limit)"}
-        )
-
-    # Sort by distance along route
-    stops.sort(key=lambda s: s["at_km"])
-    return stops
+    drv = _Driver(start_dt, max(0.0, float(cycle_used_h)) * 3600.0)
+    milestones = sorted(
+        [(float(t), "fuel") for t in fuel_drive_s if 0 < t < total_drive_s]
+        + ([(float(pickup_drive_s), "pickup")] if pickup_drive_s is not None else [])
+    )
+    milestones.append((float(total_drive_s), "dropoff"))
+
+    for target, kind in milestones:
+        while target - drv.driven > _EPS:
+            until_break = BREAK_AFTER_DRIVE_S - drv.since_break
+            until_drive_limit = DRIVE_LIMIT_S - drv.shift_drive
+            until_window = WINDOW_LIMIT_S - (drv.now - drv.shift_start).total_seconds()
+            until_cycle = CYCLE_LIMIT_S - drv.cycle
+            can_drive = min(until_break, until_drive_limit, until_window, until_cycle)
+            remaining = target - drv.driven
+            if remaining <= can_drive + _EPS:
+                drv.drive(remaining)
+                break
+            drv.drive(max(0.0, can_drive))
+            if until_cycle <= can_drive + _EPS:
+                drv.stop("rest", RESTART_MIN, "34h restart (70h/8-day cycle)", "34h restart", "OFF")
+            elif until_drive_limit <= can_drive + _EPS:
+                drv.stop("rest", REST_MIN, "10h rest (11h daily drive cap)", "10h rest", "OFF")
+            elif until_window <= can_drive + _EPS:
+                drv.stop("rest", REST_MIN, "10h rest (14h duty window)", "10h rest", "OFF")
+            else:
+                drv.stop("break", BREAK_MIN, "30m break (8h rule)", "Break 30m", "OFF")
+
+        if kind == "pickup":
+            drv.stop("pickup", PICKUP_MIN, "Pickup (1h)", "Pickup", "ONDUTY")
+        elif kind == "fuel":
+            drv.stop("fuel", FUEL_MIN, "Fuel (20m)", "Fuel 20m", "ONDUTY")
+        else:
+            drv.stop("dropoff", DROPOFF_MIN, "Dropoff (1h)", "Dropoff", "ONDUTY")
+
+    drv.plan.cycle_used_s = drv.cycle
+    return drv.plan
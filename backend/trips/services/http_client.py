@@ -0,0 +1,162 @@
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+USER_AGENT = "eld-app/1.0"
+RETRY_STATUSES = {429, 502, 503, 504}
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _http2_enabled() -> bool:
+    # httpx only negotiates h2 (via ALPN) when the optional `h2` package is installed
+    return bool(_setting("HTTP_UPSTREAM_HTTP2", True)) and importlib.util.find_spec("h2") is not None
+
+
+def _client_kwargs() -> dict:
+    limits = httpx.Limits(
+        max_connections=_setting("HTTP_POOL_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=_setting("HTTP_POOL_MAX_KEEPALIVE", 10),
+        keepalive_expiry=_setting("HTTP_POOL_KEEPALIVE_EXPIRY", 60.0),
+    )
+    return {
+        "limits": limits,
+        "http2": _http2_enabled(),
+        "timeout": _setting("HTTP_DEFAULT_TIMEOUT", 20.0),
+        "headers": {"User-Agent": USER_AGENT},
+    }
+
+
+def _build_client() -> httpx.Client:
+    return httpx.Client(**_client_kwargs())
+
+
+def get_client() -> httpx.Client:
+    """
+    Process-wide pooled client shared by the upstream services.
+
+    Rebuilt after a fork so gunicorn workers never share sockets with the
+    master process.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled async client for the running event loop (one per loop, dropped with it)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_kwargs())
+        _async_clients[loop] = client
+    return client
+
+
+def host_timeout(url: str):
+    host = urlsplit(url).hostname or ""
+    timeouts = _setting("HTTP_UPSTREAM_TIMEOUTS", {}) or {}
+    return timeouts.get(host, _setting("HTTP_DEFAULT_TIMEOUT", 20.0))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    base = _setting("HTTP_RETRY_BACKOFF_BASE", 0.25)
+    cap = _setting("HTTP_RETRY_BACKOFF_MAX", 4.0)
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def _attempt_timeout(timeout, deadline):
+    """The timeout for the next attempt: `timeout`, cut down to what is left before `deadline`."""
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise httpx.TimeoutException("deadline exceeded")
+    return min(timeout, left) if isinstance(timeout, (int, float)) else left
+
+
+def _retry_delay(attempt: int, retries: int, deadline):
+    """Backoff before the next attempt, or None when out of retries or the wait alone would pass `deadline`."""
+    if attempt >= retries:
+        return None
+    delay = backoff_delay(attempt)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def request(method: str, url: str, *, retries=None, deadline=None, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared pool, retrying transport errors and
+    429/5xx gateway responses with jittered backoff. The last response (or
+    exception) is returned/raised unchanged once retries run out.
+
+    `deadline` (a time.monotonic() value) bounds the whole call: every attempt's
+    timeout is cut to the time left, no retry starts once its backoff would pass
+    it, and httpx.TimeoutException is raised if it has already passed.
+    """
+    retries = _setting("HTTP_RETRIES", 2) if retries is None else retries
+    timeout = kwargs.pop("timeout", host_timeout(url))
+    client = get_client()
+    attempt = 0
+    while True:
+        try:
+            r = client.request(method, url, timeout=_attempt_timeout(timeout, deadline), **kwargs)
+        except httpx.TransportError:
+            delay = _retry_delay(attempt, retries, deadline)
+            if delay is None:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUSES:
+                return r
+            delay = _retry_delay(attempt, retries, deadline)
+            if delay is None:
+                return r
+            r.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def arequest(method: str, url: str, *, retries=None, deadline=None, **kwargs) -> httpx.Response:
+    """Async counterpart of request(), on the running loop's pooled client."""
+    retries = _setting("HTTP_RETRIES", 2) if retries is None else retries
+    timeout = kwargs.pop("timeout", host_timeout(url))
+    client = get_async_client()
+    attempt = 0
+    while True:
+        try:
+            r = await client.request(method, url, timeout=_attempt_timeout(timeout, deadline), **kwargs)
+        except httpx.TransportError:
+            delay = _retry_delay(attempt, retries, deadline)
+            if delay is None:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUSES:
+                return r
+            delay = _retry_delay(attempt, retries, deadline)
+            if delay is None:
+                return r
+            await r.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
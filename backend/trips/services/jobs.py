@@ -0,0 +1,150 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import RenderJob
+from .rendering import render_and_store_logs
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _get_pool() -> Optional[ThreadPoolExecutor]:
+    """In-process render pool; None when RENDER_INPROCESS_WORKERS is 0 (run_render_worker only)."""
+    global _pool
+    workers = getattr(settings, "RENDER_INPROCESS_WORKERS", 2)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-job")
+                # pick up what a previous (crashed or restarted) process left behind
+                _pool.submit(_recover)
+    return _pool
+
+
+def start_inprocess_workers() -> None:
+    """Bring up the in-process pool with the first request a process serves."""
+    _get_pool()
+
+
+def enqueue_render(trip) -> RenderJob:
+    """Queue a render for `trip`; the local pool is woken once the surrounding transaction commits."""
+    job = RenderJob.objects.create(trip=trip)
+    pool = _get_pool()
+    if pool is not None:
+        transaction.on_commit(lambda: pool.submit(_drain))
+    return job
+
+
+def latest_job(trip) -> Optional[RenderJob]:
+    return RenderJob.objects.filter(trip=trip).order_by("-created_at").first()
+
+
+def can_retry(trip) -> bool:
+    """True while the trip's jobs together have used fewer than RENDER_JOB_MAX_ATTEMPTS attempts."""
+    used = RenderJob.objects.filter(trip=trip).aggregate(n=Sum("attempts"))["n"] or 0
+    return used < getattr(settings, "RENDER_JOB_MAX_ATTEMPTS", 3)
+
+
+def claim_next(worker: str) -> Optional[RenderJob]:
+    """
+    Atomically move the oldest queued job to running and return it. The
+    status-conditional UPDATE only succeeds for one claimer per row, so
+    concurrent workers skip rows someone else took first.
+    """
+    candidates = RenderJob.objects.filter(status=RenderJob.QUEUED).order_by("created_at").values_list("pk", flat=True)
+    for pk in candidates[:10]:
+        claimed = RenderJob.objects.filter(pk=pk, status=RenderJob.QUEUED).update(
+            status=RenderJob.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1, worker=worker
+        )
+        if claimed:
+            return RenderJob.objects.select_related("trip").get(pk=pk)
+    return None
+
+
+def run_job(job: RenderJob) -> None:
+    try:
+        result = render_and_store_logs(job.trip)
+    except Exception:
+        fields = {"status": RenderJob.FAILED, "error": traceback.format_exc(limit=5)}
+    else:
+        fields = {"status": RenderJob.DONE, "error": "", "result": result}
+    # update() rather than save(): a no-op if the trip (and job) was deleted meanwhile
+    RenderJob.objects.filter(pk=job.pk).update(finished_at=timezone.now(), **fields)
+
+
+def drain(worker: str, max_jobs: Optional[int] = None) -> int:
+    """Claim and run jobs until the queue is empty (or max_jobs ran); returns how many ran."""
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def _drain() -> None:
+    close_old_connections()
+    try:
+        drain(worker_id())
+    finally:
+        close_old_connections()
+
+
+def _recover() -> None:
+    """
+    Requeue stale running jobs and drain the queue; repeats every
+    RENDER_JOB_RECOVER_INTERVAL_S so jobs of a dead process are not stranded
+    until the next enqueue.
+    """
+    close_old_connections()
+    try:
+        requeue_stale()
+        drain(worker_id())
+    except Exception:
+        # e.g. a locked database or tables not migrated yet; try again next round
+        logger.exception("render job recovery failed")
+    finally:
+        close_old_connections()
+        interval = getattr(settings, "RENDER_JOB_RECOVER_INTERVAL_S", 300)
+        if interval > 0:
+            timer = threading.Timer(interval, lambda: _pool.submit(_recover))
+            timer.daemon = True
+            timer.start()
+
+
+def requeue_stale(max_age_s: Optional[float] = None, max_attempts: Optional[int] = None) -> int:
+    """
+    Recover jobs left running by a worker that died: requeue them, or fail
+    them once they have used up their attempts. Returns the number touched.
+    """
+    max_age_s = max_age_s if max_age_s is not None else getattr(settings, "RENDER_JOB_STALE_S", 900)
+    max_attempts = max_attempts if max_attempts is not None else getattr(settings, "RENDER_JOB_MAX_ATTEMPTS", 3)
+    stale = RenderJob.objects.filter(
+        status=RenderJob.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=max_age_s)
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=RenderJob.FAILED, finished_at=timezone.now(), error="worker lost (stale running job)"
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=RenderJob.QUEUED, worker="")
+    return failed + requeued
@@ -0,0 +1,387 @@
+"""
+Direct drawing of a driver's daily log page to PDF (pydyf, vector) and PNG
+(Pillow), without laying out HTML.
+
+The page is described once as a list of primitives in PDF points with the
+origin at the top left (`layout`), and each backend replays that list. Kept
+free of Django imports, like pdf_worker; the input is the context built by
+rendering.build_day_context.
+"""
+
+import json
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pydyf
+from PIL import Image, ImageDraw, ImageFont
+
+# bump when the drawing changes, so cached native output is not reused
+VERSION = "1"
+
+PAGE_W, PAGE_H = 612.0, 792.0  # US Letter
+MARGIN_X, MARGIN_Y = 22.0, 18.0
+CONTENT_W = PAGE_W - 2 * MARGIN_X
+
+LANES = (("OFF", "Off Duty"), ("SB", "Sleeper Berth"), ("DRIVING", "Driving"), ("ONDUTY", "On Duty (Not Driving)"))
+LANE_TOTAL_KEYS = {"OFF": "total_off_duty", "SB": "total_sleeper", "DRIVING": "total_driving", "ONDUTY": "total_onduty"}
+LANE_H = 36.0
+NAME_W, TOTAL_W = 80.0, 70.0
+
+# Helvetica advance widths (AFM, 1/1000 em) for WinAnsi text; anything missing counts as 556
+_HELVETICA_W = dict(
+    zip(
+        " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~",
+        (
+            [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278]
+            + [556] * 10
+            + [278, 278, 584, 584, 584, 556, 1015]
+            + [667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833]
+            + [722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611]
+            + [278, 278, 278, 469, 556, 333]
+            + [556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833]
+            + [556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500]
+            + [334, 260, 334, 584]
+        ),
+    )
+)
+_HELVETICA_W.update({"’": 222, "‘": 222, "—": 1000, "–": 556, "•": 350})
+
+_PDF_ESCAPE_RE = re.compile(rb"([\\()])")
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(_HELVETICA_W.get(ch, 556) for ch in text) * size / 1000.0
+
+
+def _wrap(text: str, size: float, width: float) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and text_width(candidate, size) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+# ---------- layout ----------
+
+
+def _parse_iso(iso: str) -> datetime:
+    dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def duty_changes(day_bucket: Dict[str, Any]) -> List[Tuple[int, str]]:
+    """
+    (minute of day, lane) points of the duty-status line, 0..1440; the same
+    walk the HTML template's script does in the browser.
+    """
+    segs = []
+    for s in (day_bucket or {}).get("segments") or []:
+        try:
+            start, end = _parse_iso(s["startIso"]), _parse_iso(s["endIso"])
+        except (KeyError, ValueError):
+            continue
+        lane = s.get("status") if s.get("status") in LANE_TOTAL_KEYS else "OFF"
+        segs.append((start, end, lane))
+    segs.sort(key=lambda s: s[0])
+
+    def minute(dt):
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        return max(0, min(1440, round((dt - midnight).total_seconds() / 60)))
+
+    lane = segs[0][2] if segs and minute(segs[0][0]) == 0 else "OFF"
+    out = [(0, lane)]
+    for start, end, seg_lane in segs:
+        ts, te = minute(start), minute(end)
+        last_t, last_lane = out[-1]
+        if last_t != ts or last_lane != seg_lane:
+            out.append((ts, last_lane))
+            out.append((ts, seg_lane))
+        out.append((te, seg_lane))
+    if out[-1][0] < 1440:
+        out.append((1440, out[-1][1]))
+    deduped = []
+    for p in out:
+        if not deduped or deduped[-1] != p:
+            deduped.append(p)
+    return deduped
+
+
+def layout(ctx: Dict[str, Any]) -> List[tuple]:
+    """
+    Drawing primitives for one day, in points from the top-left corner:
+    ("rect", x, y, w, h, line_width), ("line", x1, y1, x2, y2, line_width),
+    ("path", [(x, y), ...], line_width) and
+    ("text", x, y, text, size, align "l"|"c"|"r", bold), y being the baseline.
+    """
+    ops: List[tuple] = []
+    x0, right = MARGIN_X, MARGIN_X + CONTENT_W
+
+    def text(x, y, value, size, align="l", bold=False):
+        value = str(value or "")
+        if value:
+            ops.append(("text", x, y, value, size, align, bold))
+
+    def fields(y, items, widths):
+        # value over a rule, label under it: the template's .field/.line/.label
+        x = x0 + 12
+        total = sum(widths)
+        avail = CONTENT_W - 24 - 10 * (len(items) - 1)
+        for (value, label), frac in zip(items, widths):
+            w = avail * frac / total
+            text(x + 1, y + 11, value, 9)
+            ops.append(("line", x, y + 14, x + w, y + 14, 0.75))
+            text(x, y + 23, label, 6.5)
+            x += w + 10
+
+    # header
+    y = MARGIN_Y
+    text(x0 + 12, y + 14, "U.S. DEPARTMENT OF TRANSPORTATION", 7)
+    text(PAGE_W / 2, y + 16, "DRIVER’S DAILY LOG", 13.5, "c", True)
+    text(PAGE_W / 2, y + 26, "(ONE CALENDAR DAY — 24 HOURS)", 8, "c")
+    text(right - 12, y + 12, "ORIGINAL — Submit to carrier within 13 days", 6.5, "r")
+    text(right - 12, y + 20, "DUPLICATE — Driver retains possession for eight days", 6.5, "r")
+    rows = (
+        (
+            (ctx.get("date_display"), "(MONTH) (DAY) (YEAR)"),
+            (ctx.get("total_miles_driving_today"), "TOTAL MILES DRIVING TODAY"),
+            (ctx.get("vehicle_numbers"), "VEHICLE NUMBERS — (SHOW EACH UNIT)"),
+        ),
+        (
+            (ctx.get("carrier_name"), "NAME OF CARRIER(S)"),
+            (ctx.get("main_office_address"), "MAIN OFFICE ADDRESS"),
+            (ctx.get("driver_signature"), "DRIVER’S SIGNATURE (I certify entries are true and correct)"),
+        ),
+        (
+            (ctx.get("co_driver_name"), "NAME OF CO-DRIVER"),
+            (ctx.get("start_time_display"), "24-HOUR PERIOD STARTING TIME"),
+            (ctx.get("total_hours_display"), "TOTAL HOURS"),
+        ),
+    )
+    for i, row in enumerate(rows):
+        fields(y + 38 + i * 34, row, (1, 1, 1))
+    head_h = 38 + len(rows) * 34 + 4
+    ops.append(("rect", x0, y, CONTENT_W, head_h, 2))
+
+    # 24-hour grid
+    y += head_h
+    gx, gw = x0 + 10 + NAME_W + 6, CONTENT_W - 20 - NAME_W - TOTAL_W - 12
+    scale_y = y + 8
+    text(x0 + 10, scale_y + 18, "Midnight", 9)
+    text(gx + gw + 6 + TOTAL_W / 2, scale_y + 18, "Total Hours", 9, "c")
+    ops.append(("rect", gx, scale_y, gw, 22, 0.75))
+    text(gx, scale_y + 8, "Mid-", 5.5, "c")
+    text(gx, scale_y + 15, "night", 5.5, "c")
+    for h in range(1, 24):
+        text(gx + gw * h / 24, scale_y + 9, "Noon" if h == 12 else str(h % 12), 6.5, "c")
+    lanes_y = scale_y + 22
+    lane_y = {}
+    for i, (key, name) in enumerate(LANES):
+        top = lanes_y + i * LANE_H
+        lane_y[key] = top + LANE_H / 2
+        text(x0 + 10, top + LANE_H / 2 + 3, name, 9)
+        text(gx + gw + 6 + TOTAL_W / 2, top + LANE_H / 2 + 3, ctx.get(LANE_TOTAL_KEYS[key]), 9, "c")
+        if i:
+            ops.append(("line", x0 + 10, top, right - 10, top, 0.75))
+        for q in range(1, 96):
+            if q % 4:
+                qx = gx + gw * q / 96
+                ops.append(("line", qx, top, qx, top + 7.5, 0.5))
+                ops.append(("line", qx, top + LANE_H - 7.5, qx, top + LANE_H, 0.5))
+    grid_bottom = lanes_y + len(LANES) * LANE_H
+    for h in range(25):
+        hx = gx + gw * h / 24
+        ops.append(("line", hx, lanes_y, hx, grid_bottom, 0.9 if 0 < h < 24 else 0.75))
+
+    try:
+        bucket = json.loads(ctx.get("day_bucket_json") or "null")
+    except ValueError:
+        bucket = None
+    changes = duty_changes(bucket)
+    points = [(gx + gw * t / 1440, lane_y[lane]) for t, lane in changes]
+    if len(points) > 1:
+        ops.append(("path", points, 2.25))
+    timeline_h = grid_bottom + 10 - y
+    ops.append(("rect", x0, y, CONTENT_W, timeline_h, 2))
+
+    # remarks
+    y += timeline_h
+    rx, rw = x0 + 10, CONTENT_W - 20
+    ops.append(("rect", rx, y + 8, rw, 20, 0.75))
+    for h in range(1, 24):
+        hx = rx + rw * h / 24
+        ops.append(("line", hx, y + 8, hx, y + 8 + (10 if h % 6 else 20), 0.5))
+    ops.append(("rect", rx, y + 28, rw, 140, 0.75))
+    text(rx + 8, y + 42, "Remarks", 8)
+    for n, line in enumerate(_wrap(str(ctx.get("remarks") or ""), 9, rw - 16)[:11]):
+        text(rx + 8, y + 56 + n * 12, line, 9)
+    remarks_h = 8 + 20 + 140 + 8
+    ops.append(("rect", x0, y, CONTENT_W, remarks_h, 2))
+
+    # footer
+    y += remarks_h
+    fields(
+        y + 6,
+        (
+            (ctx.get("shipping_no"), "Pro or Shipping No."),
+            (ctx.get("shipper_name"), "Name of Shipper"),
+            (ctx.get("commodity"), "Commodity"),
+        ),
+        (1.3, 1, 1),
+    )
+    ops.append(("rect", x0, y, CONTENT_W, 40, 2))
+    return ops
+
+
+# ---------- PDF ----------
+
+
+def _pdf_text(value: str) -> bytes:
+    raw = value.encode("cp1252", errors="replace")
+    return b"(" + _PDF_ESCAPE_RE.sub(rb"\\\1", raw) + b")"
+
+
+def _page_stream(ops: Sequence[tuple]) -> pydyf.Stream:
+    stream = pydyf.Stream(compress=True)
+    stream.set_line_cap(0)
+    stream.set_line_join(0)
+    for op in ops:
+        kind = op[0]
+        if kind == "rect":
+            _, x, y, w, h, lw = op
+            stream.set_line_width(lw)
+            stream.rectangle(x, PAGE_H - y - h, w, h)
+            stream.stroke()
+        elif kind == "line":
+            _, x1, y1, x2, y2, lw = op
+            stream.set_line_width(lw)
+            stream.move_to(x1, PAGE_H - y1)
+            stream.line_to(x2, PAGE_H - y2)
+            stream.stroke()
+        elif kind == "path":
+            _, points, lw = op
+            stream.set_line_width(lw)
+            stream.set_line_cap(2)
+            stream.move_to(points[0][0], PAGE_H - points[0][1])
+            for px, py in points[1:]:
+                stream.line_to(px, PAGE_H - py)
+            stream.stroke()
+            stream.set_line_cap(0)
+        elif kind == "text":
+            _, x, y, value, size, align, bold = op
+            if align != "l":
+                x -= text_width(value, size) / (2 if align == "c" else 1)
+            stream.begin_text()
+            stream.set_font_size("F1", size)
+            if bold:
+                # fill + stroke the outlines: bold weight without a second font and width table
+                stream.set_text_rendering(2)
+                stream.set_line_width(size * 0.035)
+            stream.set_text_matrix(1, 0, 0, 1, x, PAGE_H - y)
+            stream.show_text(_pdf_text(value))
+            if bold:
+                stream.set_text_rendering(0)
+            stream.end_text()
+    return stream
+
+
+def write_pdf(pages: Sequence[Sequence[tuple]], out_path: str) -> None:
+    """One PDF page per layout() list, with the base-14 Helvetica font (nothing embedded)."""
+    pdf = pydyf.PDF()
+    font = pydyf.Dictionary(
+        {
+            "Type": "/Font",
+            "Subtype": "/Type1",
+            "BaseFont": "/Helvetica",
+            "Encoding": "/WinAnsiEncoding",
+        }
+    )
+    pdf.add_object(font)
+    resources = pydyf.Dictionary({"Font": pydyf.Dictionary({"F1": font.reference})})
+    for ops in pages:
+        stream = _page_stream(ops)
+        pdf.add_object(stream)
+        page = pydyf.Dictionary(
+            {
+                "Type": "/Page",
+                "Parent": pdf.pages.reference,
+                "MediaBox": pydyf.Array([0, 0, PAGE_W, PAGE_H]),
+                "Contents": stream.reference,
+                "Resources": resources,
+            }
+        )
+        pdf.add_page(page)
+    with open(out_path, "wb") as f:
+        pdf.write(f, compress=True)
+
+
+# ---------- PNG ----------
+
+
+@lru_cache(maxsize=32)
+def _font(px: int):
+    # Helvetica-metric faces first; text is still fitted to Helvetica widths below
+    for name in ("LiberationSans-Regular.ttf", "Arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, px)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=px)
+
+
+def _draw(img: Image.Image, ops: Sequence[tuple], scale: float) -> None:
+    draw = ImageDraw.Draw(img)
+
+    def px(v):
+        return round(v * scale)
+
+    for op in ops:
+        kind = op[0]
+        if kind == "rect":
+            _, x, y, w, h, lw = op
+            draw.rectangle((px(x), px(y), px(x + w), px(y + h)), outline=0, width=max(1, px(lw)))
+        elif kind == "line":
+            _, x1, y1, x2, y2, lw = op
+            draw.line((px(x1), px(y1), px(x2), px(y2)), fill=0, width=max(1, px(lw)))
+        elif kind == "path":
+            _, points, lw = op
+            draw.line([(px(x), px(y)) for x, y in points], fill=0, width=max(1, px(lw)))
+        elif kind == "text":
+            _, x, y, value, size, align, bold = op
+            font = _font(px(size))
+            # keep the PDF's (Helvetica) extents so wrapped and aligned text lands in the same boxes
+            fit = text_width(value, size) * scale
+            actual = font.getlength(value)
+            if actual > fit > 0:
+                font = _font(max(1, int(px(size) * fit / actual)))
+            anchor = {"l": "ls", "c": "ms", "r": "rs"}[align]
+            draw.text((px(x), px(y)), value, fill=0, font=font, anchor=anchor, stroke_width=1 if bold else 0)
+
+
+@lru_cache(maxsize=4)
+def _background(dpi: int) -> Tuple[Image.Image, frozenset]:
+    """
+    Everything on the page that does not depend on the day (frame, grid,
+    labels), drawn once per resolution; pages only add their own primitives.
+    """
+    scale = dpi / 72.0
+    static = frozenset(op for op in layout({}) if op[0] != "path")
+    img = Image.new("L", (round(PAGE_W * scale), round(PAGE_H * scale)), 255)
+    _draw(img, list(static), scale)
+    return img, static
+
+
+def write_png(ops: Sequence[tuple], out_path: str, dpi: int = 96) -> None:
+    background, static = _background(dpi)
+    img = background.copy()
+    _draw(img, [op for op in ops if op[0] == "path" or op not in static], dpi / 72.0)
+    img.save(out_path, format="PNG", compress_level=3)
@@ -1,18 +1,26 @@
 # api/trips/services/overpass.py
-import httpx
+import time
+
+from .http_client import arequest, request
+from .poi_index import get_poi_index
 
 OVERPASS = "https://overpass-api.de/api/interpreter"
 
+_FILTERS = {
+    "rest": '(node["amenity"~"rest_area|parking"]["hgv"~"yes|designated"];way["highway"~"services|rest_area"];);',
+    "fuel": '(node["amenity"="fuel"]["fuel:diesel"!="no"];);',
+}
+
 
-def _query(lat, lng, radius_m, kind):
+def _query(lat, lng, radius_m, kind, timeout=25):
     if kind in ("break", "rest"):
-        filt = '(node["amenity"~"rest_area|parking"]["hgv"~"yes|designated"];way["highway"~"services|rest_area"];);'
+        filt = _FILTERS["rest"]
     elif kind == "fuel":
-        filt = '(node["amenity"="fuel"]["fuel:diesel"!="no"];);'
+        filt = _FILTERS["fuel"]
     else:
         return None
     return f"""
-    [out:json][timeout:25];
+    [out:json][timeout:{int(timeout)}];
     (
       {filt}
     )->.a;
@@ -21,15 +29,20 @@ def _query(lat, lng, radius_m, kind):
     """
 
 
-def find_pois(lat, lng, kind, radius_m=15000):
-    q = _query(lat, lng, radius_m, kind)
-    if not q:
-        return []
-    with httpx.Client(timeout=30) as client:
-        r = client.post(OVERPASS, data={"data": q}, headers={"User-Agent": "eld-app/1.0"})
-        if r.status_code != 200:
-            return []
-        elements = r.json().get("elements", [])
+def extract_query(south, west, north, east, timeout=180):
+    """Bulk query for every fuel/rest POI inside a bbox, for building a local extract."""
+    bbox = f"{south},{west},{north},{east}"
+    return f"""
+    [out:json][timeout:{int(timeout)}][bbox:{bbox}];
+    (
+      {_FILTERS["fuel"]}
+      {_FILTERS["rest"]}
+    );
+    out center;
+    """
+
+
+def _parse_elements(elements):
     pois = []
     for e in elements:
         tags = e.get("tags", {})
@@ -43,3 +56,48 @@ def find_pois(lat, lng, kind, radius_m=15000):
             {"id": str(e.get("id")), "name": tags.get("name"), "coord": {"lat": clat, "lng": clng}, "tags": tags}
         )
     return pois
+
+
+def _server_timeout(deadline):
+    """Overpass's own [timeout:], so the server gives up no later than the caller does."""
+    if deadline is None:
+        return 25
+    return max(1, min(25, int(deadline - time.monotonic())))
+
+
+def find_pois(lat, lng, kind, radius_m=15000, deadline=None):
+    """
+    POIs of `kind` around a point, from the local index when it covers the
+    area, else from Overpass. With a `deadline` (time.monotonic()) the upstream
+    call is cut short at it, and a lookup that only starts after it returns []
+    without calling out, so lookups nobody waits for free their worker quickly.
+    """
+    index = get_poi_index()
+    if index.covers(lat, lng, radius_m):
+        return index.nearest(lat, lng, kind, radius_m=radius_m)
+
+    if deadline is not None and time.monotonic() >= deadline:
+        return []
+    q = _query(lat, lng, radius_m, kind, timeout=_server_timeout(deadline))
+    if not q:
+        return []
+    r = request("POST", OVERPASS, data={"data": q}, deadline=deadline)
+    if r.status_code != 200:
+        return []
+    return _parse_elements(r.json().get("elements", []))
+
+
+async def afind_pois(lat, lng, kind, radius_m=15000, deadline=None):
+    index = get_poi_index()
+    if index.covers(lat, lng, radius_m):
+        return index.nearest(lat, lng, kind, radius_m=radius_m)
+
+    if deadline is not None and time.monotonic() >= deadline:
+        return []
+    q = _query(lat, lng, radius_m, kind, timeout=_server_timeout(deadline))
+    if not q:
+        return []
+    r = await arequest("POST", OVERPASS, data={"data": q}, deadline=deadline)
+    if r.status_code != 200:
+        return []
+    return _parse_elements(r.json().get("elements", []))
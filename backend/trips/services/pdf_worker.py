@@ -0,0 +1,35 @@
+"""
+WeasyPrint page rendering for worker processes.
+
+Kept free of Django imports: workers are spawned fresh and only ever receive
+an HTML string, a base URL and an output path.
+"""
+
+from typing import Optional
+
+_html_cls = None
+
+
+def init_worker(warm_html: Optional[str] = None, base_url: Optional[str] = None) -> None:
+    """
+    Pool initializer: import WeasyPrint once and lay out a representative page,
+    so fontconfig, font files and the template's CSS are loaded before the
+    first real job arrives.
+    """
+    global _html_cls
+    from weasyprint import HTML
+
+    _html_cls = HTML
+    if warm_html:
+        try:
+            HTML(string=warm_html, base_url=base_url).write_pdf()
+        except Exception:
+            # warming is best effort; real jobs report their own errors
+            pass
+
+
+def render_pdf(html: str, base_url: Optional[str], out_path: str) -> str:
+    if _html_cls is None:
+        init_worker()
+    _html_cls(string=html, base_url=base_url).write_pdf(out_path)
+    return out_path
@@ -0,0 +1,157 @@
+import json
+import math
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+EARTH_R = 6371000.0
+CELL_DEG = 0.1  # ~11 km of latitude per bucket
+
+
+def _haversine_m(lat1, lng1, lat2, lng2) -> float:
+    φ1, λ1 = math.radians(lat1), math.radians(lng1)
+    φ2, λ2 = math.radians(lat2), math.radians(lng2)
+    dφ, dλ = φ2 - φ1, λ2 - λ1
+    a = math.sin(dφ / 2) ** 2 + math.cos(φ1) * math.cos(φ2) * math.sin(dλ / 2) ** 2
+    return 2 * EARTH_R * math.asin(math.sqrt(a))
+
+
+def classify(tags: Dict[str, Any]) -> Optional[str]:
+    """Mirror of the Overpass filters in overpass._query."""
+    amenity = tags.get("amenity")
+    if amenity == "fuel" and tags.get("fuel:diesel") != "no":
+        return "fuel"
+    if amenity in ("rest_area", "parking") and tags.get("hgv") in ("yes", "designated"):
+        return "rest"
+    if tags.get("highway") in ("services", "rest_area"):
+        return "rest"
+    return None
+
+
+def _kind_key(kind: str) -> Optional[str]:
+    if kind in ("break", "rest"):
+        return "rest"
+    if kind == "fuel":
+        return "fuel"
+    return None
+
+
+def _radius_box(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    dlat = math.degrees(radius_m / EARTH_R)
+    coslat = max(math.cos(math.radians(lat)), 1e-6)
+    dlng = math.degrees(radius_m / (EARTH_R * coslat))
+    return (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+
+class PoiIndex:
+    """
+    Grid-bucketed POI store loaded from Overpass JSON extracts.
+
+    Each POI lives in the CELL_DEG x CELL_DEG bucket containing it; a radius
+    query only scans the buckets overlapping the query's bounding box. An
+    extract only counts as coverage for its own bbox (south, west, north,
+    east), so areas outside every loaded extract still go to the live API.
+    """
+
+    def __init__(self, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[str, int, int], List[Dict[str, Any]]] = defaultdict(list)
+        self._coverage: List[Tuple[float, float, float, float]] = []
+        self._seen = set()
+        self.size = 0
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg)))
+
+    def add(self, kind: str, poi: Dict[str, Any]) -> None:
+        key = (kind, poi["id"])
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        c = poi["coord"]
+        self._cells[(kind, *self._cell(c["lat"], c["lng"]))].append(poi)
+        self.size += 1
+
+    def add_coverage(self, bbox) -> None:
+        south, west, north, east = (float(v) for v in bbox)
+        self._coverage.append((south, west, north, east))
+
+    def load_overpass_json(self, data: Dict[str, Any]) -> int:
+        """Load an `[out:json]` Overpass response; returns the number of POIs indexed."""
+        added = 0
+        lats, lngs = [], []
+        for e in data.get("elements", []):
+            tags = e.get("tags", {})
+            if "center" in e:
+                clat, clng = e["center"]["lat"], e["center"]["lon"]
+            else:
+                clat, clng = e.get("lat"), e.get("lon")
+            if clat is None or clng is None:
+                continue
+            lats.append(clat)
+            lngs.append(clng)
+            kind = classify(tags)
+            if not kind:
+                continue
+            before = self.size
+            self.add(
+                kind,
+                {"id": str(e.get("id")), "name": tags.get("name"), "coord": {"lat": clat, "lng": clng}, "tags": tags},
+            )
+            added += self.size - before
+        bbox = data.get("bbox")
+        if bbox:
+            self.add_coverage(bbox)
+        elif lats:
+            self.add_coverage((min(lats), min(lngs), max(lats), max(lngs)))
+        return added
+
+    def load_file(self, path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            return self.load_overpass_json(json.load(f))
+
+    def covers(self, lat: float, lng: float, radius_m: float) -> bool:
+        s, w, n, e = _radius_box(lat, lng, radius_m)
+        return any(s >= cs and w >= cw and n <= cn and e <= ce for cs, cw, cn, ce in self._coverage)
+
+    def nearest(
+        self, lat: float, lng: float, kind: str, radius_m: float = 15000, limit: int = 15
+    ) -> List[Dict[str, Any]]:
+        kind = _kind_key(kind)
+        if not kind:
+            return []
+        s, w, n, e = _radius_box(lat, lng, radius_m)
+        r0, c0 = self._cell(s, w)
+        r1, c1 = self._cell(n, e)
+        found = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                for poi in self._cells.get((kind, r, c), ()):
+                    pc = poi["coord"]
+                    d = _haversine_m(lat, lng, pc["lat"], pc["lng"])
+                    if d <= radius_m:
+                        found.append((d, poi))
+        found.sort(key=lambda x: x[0])
+        return [p for _, p in found[:limit]]
+
+
+_index: Optional[PoiIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_poi_index() -> PoiIndex:
+    """Process-wide index built lazily from settings.POI_EXTRACT_FILES."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                idx = PoiIndex()
+                for path in getattr(settings, "POI_EXTRACT_FILES", None) or []:
+                    try:
+                        idx.load_file(path)
+                    except (OSError, ValueError):
+                        continue
+                _index = idx
+    return _index
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+from django.template.loader import get_template
+
+_version = None
+_version_lock = threading.Lock()
+_last_prune = 0.0
+
+# every template whose source affects rendered log pages
+_TEMPLATES = (
+    "trips/daily_log.html",
+    "trips/_daily_log_page.html",
+    "trips/_daily_log_style.html",
+    "trips/daily_log_book.html",
+)
+
+
+def enabled() -> bool:
+    return getattr(settings, "RENDER_CACHE_ENABLED", True)
+
+
+def cache_root() -> str:
+    root = getattr(settings, "RENDER_CACHE_DIR", None) or os.path.join(settings.MEDIA_ROOT, "render_cache")
+    return os.path.abspath(root)
+
+
+def template_version() -> str:
+    """Hash of the log templates, the WeasyPrint version and RENDER_CACHE_VERSION (computed once per process)."""
+    global _version
+    if _version is None:
+        with _version_lock:
+            if _version is None:
+                import weasyprint
+
+                h = hashlib.sha256()
+                for name in _TEMPLATES:
+                    h.update(name.encode("utf-8"))
+                    h.update(get_template(name).template.source.encode("utf-8"))
+                h.update(str(getattr(weasyprint, "__version__", "")).encode("utf-8"))
+                h.update(str(getattr(settings, "RENDER_CACHE_VERSION", "1")).encode("utf-8"))
+                _version = h.hexdigest()
+    return _version
+
+
+def make_key(kind: str, context: Any) -> str:
+    """Content address of a rendered artefact: template version + kind + the full render context."""
+    raw = json.dumps({"v": template_version(), "kind": kind, "ctx": context}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry(key: str, suffix: str) -> str:
+    return os.path.join(cache_root(), key[:2], f"{key}{suffix}")
+
+
+def unlink(path: str) -> None:
+    """
+    Remove `path` before writing it: outputs may be hard links into the cache,
+    and writing through one would change the cached entry for every trip.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def fetch(key: str, suffix: str, dest: str) -> bool:
+    """Materialise a cached entry at `dest` (hard link, copy across filesystems); False on a miss."""
+    if not enabled():
+        return False
+    src = _entry(key, suffix)
+    try:
+        os.utime(src)  # mtime doubles as last-use time for pruning
+        _link_or_copy(src, dest)
+    except OSError:
+        return False
+    return True
+
+
+def store(key: str, suffix: str, src: str) -> None:
+    if not enabled():
+        return
+    dst = _entry(key, suffix)
+    if os.path.exists(dst):
+        return
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _link_or_copy(src, dst)
+    except OSError:
+        # the cache is an optimisation; never fail a render over it
+        pass
+
+
+def prune(max_bytes: Optional[int] = None, max_age_s: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Drop entries unused for max_age_s, then the least recently used ones until
+    the cache fits in max_bytes. Returns (files removed, bytes freed).
+    """
+    max_bytes = max_bytes if max_bytes is not None else getattr(settings, "RENDER_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+    max_age_s = max_age_s if max_age_s is not None else getattr(settings, "RENDER_CACHE_MAX_AGE_S", 30 * 24 * 3600)
+    entries = []
+    for dirpath, _, filenames in os.walk(cache_root()):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age_s
+    removed = freed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def maybe_prune() -> None:
+    """prune() at most once per RENDER_CACHE_PRUNE_INTERVAL_S per process."""
+    global _last_prune
+    if not enabled():
+        return
+    now = time.monotonic()
+    if _last_prune and now - _last_prune < getattr(settings, "RENDER_CACHE_PRUNE_INTERVAL_S", 3600):
+        return
+    _last_prune = now
+    prune()
@@ -1,16 +1,28 @@
 import io
 import os
+import logging
 import re
 import json
-import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.dispatch import receiver
+from django.template import engines
+from django.template.loader import get_template
+from django.utils.autoreload import file_changed
+from django.utils.safestring import mark_safe
 
 from weasyprint import HTML
-from PyPDF2 import PdfMerger
+from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+
+from . import catalog, native_log, pdf_worker, render_cache
+
+logger = logging.getLogger(__name__)
 
 
 def _ensure_dir(path: str) -> None:
@@ -172,18 +184,271 @@ def build_day_context(calc: Dict[str, Any], extras: Dict[str, Any], bucket: Dict
 _GRADIENT_COLOR_TICK = "rgba(0,0,0,0.85)"
 _GRADIENT_COLOR_HOUR = "rgba(0,0,0,0.90)"
 _VAR_IN_GRADIENT_PATTERNS = [
-    (r"var\(\s*--tick\s*\)", _GRADIENT_COLOR_TICK),
-    (r"var\(\s*--hour\s*\)", _GRADIENT_COLOR_HOUR),
+    (re.compile(r"var\(\s*--tick\s*\)", re.IGNORECASE), _GRADIENT_COLOR_TICK),
+    (re.compile(r"var\(\s*--hour\s*\)", re.IGNORECASE), _GRADIENT_COLOR_HOUR),
 ]
 
 
 def _sanitize_for_weasy(html: str) -> str:
     out = html
     for pat, repl in _VAR_IN_GRADIENT_PATTERNS:
-        out = re.sub(pat, repl, out, flags=re.IGNORECASE)
+        out = pat.sub(repl, out)
     return out
 
 
+TEMPLATE_NAME = "trips/daily_log.html"
+PAGE_TEMPLATE_NAME = "trips/_daily_log_page.html"
+BOOK_TEMPLATE_NAME = "trips/daily_log_book.html"
+STYLE_TEMPLATE_NAME = "trips/_daily_log_style.html"
+_INCLUDE_RE = re.compile(r"""{%\s*include\s+["']([^"']+)["']\s*%}""")
+# stands in for the style block in compiled skeletons; swapped for the browser or WeasyPrint CSS after rendering
+_STYLE_MARKER = "<!--daily-log-style-->"
+
+_skeletons: Dict[str, tuple] = {}
+_skeletons_lock = threading.Lock()
+
+
+def _inline_includes(source: str) -> str:
+    def _sub(m):
+        if m.group(1) == STYLE_TEMPLATE_NAME:
+            return _STYLE_MARKER
+        return _inline_includes(get_template(m.group(1)).template.source)
+
+    return _INCLUDE_RE.sub(_sub, source)
+
+
+def _skeleton(name: str) -> tuple:
+    """
+    (template, style, weasy_style) for one of the log templates, built once per
+    process: plain includes are inlined into a single compiled template and the
+    static style block is sanitized for WeasyPrint up front, so a page costs
+    one template render and no regex passes.
+    """
+    skeleton = _skeletons.get(name)
+    if skeleton is None:
+        with _skeletons_lock:
+            skeleton = _skeletons.get(name)
+            if skeleton is None:
+                style = get_template(STYLE_TEMPLATE_NAME).template.source
+                template = engines["django"].from_string(_inline_includes(get_template(name).template.source))
+                skeleton = (template, style, _sanitize_for_weasy(style))
+                _skeletons[name] = skeleton
+    return skeleton
+
+
+@receiver(file_changed, dispatch_uid="trips.rendering.skeletons")
+def _drop_skeletons(sender, file_path, **kwargs):
+    # runserver reloads templates in place; rebuild the skeletons alongside
+    with _skeletons_lock:
+        _skeletons.clear()
+
+
+def _render_log(name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+    """(browser html, WeasyPrint html) of a log template from a single render."""
+    template, style, weasy_style = _skeleton(name)
+    out = template.render(context)
+    return out.replace(_STYLE_MARKER, style, 1), out.replace(_STYLE_MARKER, weasy_style, 1)
+
+
+COMBINED_PDF_NAME = "daily_logs_combined.pdf"
+PAGE_MAP_NAME = "pages.json"
+LEGACY_ZIP_NAMES = ("daily_logs_html.zip", "daily_logs_pdf.zip")
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _base_url() -> str:
+    return (
+        getattr(settings, "WEASYPRINT_BASE_URL", None) or getattr(settings, "STATIC_ROOT", None) or settings.MEDIA_ROOT
+    )
+
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Shared pool of warm WeasyPrint processes (PDF_POOL_WORKERS per server
+    process; 0 renders in the calling thread). Spawned rather than forked so
+    the workers never inherit DB connections or threads from the web process.
+    """
+    global _pdf_pool
+    workers = getattr(settings, "PDF_POOL_WORKERS", 2)
+    if workers <= 0:
+        return None
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                _, warm_html = _render_log(TEMPLATE_NAME, build_day_context({}, {}, {}))
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=pdf_worker.init_worker,
+                    initargs=(warm_html, _base_url()),
+                )
+    return _pdf_pool
+
+
+def _reset_pdf_pool() -> None:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_pdfs(jobs: List[tuple]) -> None:
+    """Write every (html, pdf_path) page, in parallel across the process pool when enabled."""
+    base_url = _base_url()
+    pool = _get_pdf_pool() if len(jobs) > 1 else None
+    if pool is not None:
+        try:
+            futures = [pool.submit(pdf_worker.render_pdf, html, base_url, path) for html, path in jobs]
+            for fut in futures:
+                fut.result()
+            return
+        except BrokenProcessPool:
+            # a worker died (OOM, signal); rebuild next time and finish this trip inline
+            _reset_pdf_pool()
+    for html, path in jobs:
+        HTML(string=html, base_url=base_url).write_pdf(path)
+
+
+def _render_book(days: List[tuple], out_path: str) -> Dict[str, List[int]]:
+    """
+    Lay out every (date, context) day as a section of one HTML document in a
+    single WeasyPrint pass and write the combined PDF. Returns {date: [first,
+    last]} page ranges, found from the section anchors on each page.
+    """
+    sections = [
+        {
+            "anchor": f"day-{date_str}",
+            "html": mark_safe(_skeleton(PAGE_TEMPLATE_NAME)[0].render({**ctx, "id_prefix": f"d{i}-"})),
+        }
+        for i, (date_str, ctx) in enumerate(days)
+    ]
+    _, book = _render_log(BOOK_TEMPLATE_NAME, {"days": sections})
+    document = HTML(string=book, base_url=_base_url()).render()
+
+    starts = []
+    for index, page in enumerate(document.pages):
+        for anchor in page.anchors:
+            if anchor.startswith("day-"):
+                starts.append((index, anchor[len("day-") :]))
+    document.write_pdf(out_path)
+
+    starts.sort()
+    page_map = {}
+    for n, (first, date_str) in enumerate(starts):
+        last = starts[n + 1][0] - 1 if n + 1 < len(starts) else len(document.pages) - 1
+        page_map[date_str] = [first, max(first, last)]
+    return page_map
+
+
+def _render_native_book(days: List[tuple], out_path: str) -> Dict[str, List[int]]:
+    """Book mode with the native engine: one drawn page per (date, context) day."""
+    native_log.write_pdf([native_log.layout(ctx) for _, ctx in days], out_path)
+    return {date_str: [i, i] for i, (date_str, _) in enumerate(days)}
+
+
+def _native_page(context: Dict[str, Any], png_path: str, pdf_path: Optional[str] = None) -> bool:
+    """
+    Draw one day's PNG (and PDF unless pdf_path is None, as in book mode) with
+    native_log, from the render cache when possible. False if drawing failed and
+    the page should go through WeasyPrint instead.
+    """
+    dpi = getattr(settings, "RENDER_PNG_DPI", 96)
+    key = render_cache.make_key("native", {"v": native_log.VERSION, "dpi": dpi, "ctx": context})
+    outputs = [(".png", png_path)] + ([(".pdf", pdf_path)] if pdf_path else [])
+    for _, path in outputs:
+        render_cache.unlink(path)
+    if all(render_cache.fetch(key, suffix, path) for suffix, path in outputs):
+        return True
+    for _, path in outputs:
+        render_cache.unlink(path)  # a partial hit is still a link into the cache
+    try:
+        ops = native_log.layout(context)
+        native_log.write_png(ops, png_path, dpi)
+        if pdf_path:
+            native_log.write_pdf([ops], pdf_path)
+    except Exception:
+        logger.exception("native log drawing failed for %s; falling back to WeasyPrint", context.get("date_display"))
+        for _, path in outputs:
+            render_cache.unlink(path)
+        return False
+    for suffix, path in outputs:
+        render_cache.store(key, suffix, path)
+    return True
+
+
+def _cut_pages(reader: PdfReader, first: int, last: int) -> bytes:
+    writer = PdfWriter()
+    for i in range(first, last + 1):
+        writer.add_page(reader.pages[i])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _cut_days(trip, dates: List[str]) -> Dict[str, Optional[str]]:
+    """
+    {date: path} of the given days' PDFs (None for days not in the page map),
+    cutting the missing ones out of the combined PDF. The page map is read and
+    the combined PDF parsed at most once per call, however many days are cut.
+    """
+    out_dir = _media_rel("trips", str(trip.id).strip(), "logs")
+    paths = {d: os.path.join(out_dir, f"log-{d}.pdf") for d in dates}
+    missing = [d for d in dates if not os.path.exists(paths[d])]
+    if not missing:
+        return paths
+    try:
+        with open(os.path.join(out_dir, PAGE_MAP_NAME), encoding="utf-8") as f:
+            page_map = json.load(f)
+    except (OSError, ValueError):
+        page_map = {}
+    reader = None
+    for d in missing:
+        pages = page_map.get(d)
+        if not pages:
+            paths[d] = None
+            continue
+        if reader is None:
+            reader = PdfReader(os.path.join(out_dir, COMBINED_PDF_NAME))
+        tmp = f"{paths[d]}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_cut_pages(reader, *pages))
+        os.replace(tmp, paths[d])
+    return paths
+
+
+def day_pdf_path(trip, date_str: str) -> Optional[str]:
+    """
+    Path of one day's PDF. In book mode (RENDER_MODE=book) per-day files are
+    only cut out of the combined PDF the first time someone asks for them.
+    """
+    return _cut_days(trip, [date_str])[date_str]
+
+
+def log_files(trip, fmt: str) -> List[Tuple[str, str, str]]:
+    """
+    (arcname, path, sha256) of a trip's rendered per-day files in date order,
+    fmt "html", "pdf" or "png", from the file catalog; empty until the trip has
+    been rendered. Book-mode PDFs are cut from the combined PDF (and
+    catalogued) here, i.e. only when someone asks for them.
+    """
+    rows = catalog.files(trip, fmt)
+    if not rows and fmt == "pdf":
+        page_map = catalog.files(trip, "pagemap")
+        if page_map:
+            try:
+                with open(catalog.abs_path(page_map[0].storage_path), encoding="utf-8") as f:
+                    dates = sorted(json.load(f))
+            except (OSError, ValueError):
+                return []
+            cut = _cut_days(trip, dates)
+            catalog.record_pages(trip, "pdf", [(i, cut[d]) for i, d in enumerate(dates) if cut[d]])
+            rows = catalog.files(trip, fmt)
+    return [(os.path.basename(r.storage_path), catalog.abs_path(r.storage_path), r.checksum) for r in rows]
+
+
 def render_and_store_logs(trip) -> List[Dict[str, Any]]:
     calc = trip.calc_payload or {}
     extras = getattr(trip, "extras", None) or {}
@@ -194,12 +459,12 @@ def render_and_store_logs(trip) -> List[Dict[str, Any]]:
     out_dir = _media_rel(base_subdir)
     _ensure_dir(out_dir)
 
-    base_url = (
-        getattr(settings, "WEASYPRINT_BASE_URL", None) or getattr(settings, "STATIC_ROOT", None) or settings.MEDIA_ROOT
-    )
-    template_name = "trips/daily_log.html"
-
+    book_mode = getattr(settings, "RENDER_MODE", "pages") == "book"
+    native = getattr(settings, "RENDER_ENGINE", "html") == "native"
     per_day_pdf_paths: List[str] = []
+    pdf_jobs: List[tuple] = []
+    pdf_keys: List[str] = []
+    book_days: List[tuple] = []
 
     def _date_key(b):
         try:
@@ -212,20 +477,41 @@ def render_and_store_logs(trip) -> List[Dict[str, Any]]:
         safe_date = date_str.replace("/", "-")
         html_filename = f"log-{safe_date}.html"
         pdf_filename = f"log-{safe_date}.pdf"
+        png_filename = f"log-{safe_date}.png"
         html_path = os.path.join(out_dir, html_filename)
         pdf_path = os.path.join(out_dir, pdf_filename)
+        png_path = os.path.join(out_dir, png_filename)
         html_url = _media_url(base_subdir, html_filename)
         pdf_url = _media_url(base_subdir, pdf_filename)
 
         context = build_day_context(calc, extras, bucket)
-        html_str = render_to_string(template_name, context)
-        html_for_weasy = _sanitize_for_weasy(html_str)
-
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(html_str)
-
-        HTML(string=html_for_weasy, base_url=base_url).write_pdf(pdf_path)
-
+        # identical day contexts (across re-renders and trips) share cached output
+        key = render_cache.make_key("page", context)
+        render_cache.unlink(html_path)
+        weasy_html = None
+        if not render_cache.fetch(key, ".html", html_path):
+            html_str, weasy_html = _render_log(TEMPLATE_NAME, context)
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(html_str)
+            render_cache.store(key, ".html", html_path)
+
+        if book_mode:
+            book_days.append((safe_date, context))
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)  # stale; cut again from the new combined PDF on demand
+            has_png = native and _native_page(context, png_path)
+        elif native and _native_page(context, png_path, pdf_path):
+            has_png = True
+        else:
+            has_png = False
+            render_cache.unlink(pdf_path)
+            if not render_cache.fetch(key, ".pdf", pdf_path):
+                if weasy_html is None:
+                    _, weasy_html = _render_log(TEMPLATE_NAME, context)
+                pdf_jobs.append((weasy_html, pdf_path))
+                pdf_keys.append(key)
+        if not has_png:
+            render_cache.unlink(png_path)
         per_day_pdf_paths.append(pdf_path)
         results.append(
             {
@@ -234,42 +520,71 @@ def render_and_store_logs(trip) -> List[Dict[str, Any]]:
                 "html_url": html_url,
                 "pdf_path": pdf_path,
                 "pdf_url": pdf_url,
+                "png_path": png_path if has_png else None,
+                "png_url": _media_url(base_subdir, png_filename) if has_png else None,
             }
         )
 
-    zip_html_name = "daily_logs_html.zip"
-    zip_html_path = os.path.join(out_dir, zip_html_name)
-    with zipfile.ZipFile(zip_html_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+    combined_pdf_path = os.path.join(out_dir, COMBINED_PDF_NAME)
+    page_map_path = os.path.join(out_dir, PAGE_MAP_NAME)
+    render_cache.unlink(combined_pdf_path)
+    render_cache.unlink(page_map_path)
+    if book_mode:
+        if native:
+            book_key = render_cache.make_key("native-book", {"v": native_log.VERSION, "days": book_days})
+        else:
+            book_key = render_cache.make_key("book", book_days)
+        if render_cache.fetch(book_key, ".pdf", combined_pdf_path) and render_cache.fetch(
+            book_key, ".json", page_map_path
+        ):
+            with open(page_map_path, encoding="utf-8") as f:
+                page_map = json.load(f)
+        else:
+            # one layout pass for the whole trip; no per-day files, no merge
+            render_cache.unlink(combined_pdf_path)
+            page_map = None
+            if native:
+                try:
+                    page_map = _render_native_book(book_days, combined_pdf_path)
+                except Exception:
+                    logger.exception("native log drawing failed for trip %s; falling back to WeasyPrint", trip.id)
+                    render_cache.unlink(combined_pdf_path)
+            if page_map is None:
+                page_map = _render_book(book_days, combined_pdf_path)
+            with open(page_map_path, "w", encoding="utf-8") as f:
+                json.dump(page_map, f)
+            render_cache.store(book_key, ".pdf", combined_pdf_path)
+            render_cache.store(book_key, ".json", page_map_path)
         for r in results:
-            zf.write(r["html_path"], arcname=os.path.basename(r["html_path"]))
-    zip_html_url = _media_url(base_subdir, zip_html_name)
-
-    zip_pdf_name = "daily_logs_pdf.zip"
-    zip_pdf_path = os.path.join(out_dir, zip_pdf_name)
-    with zipfile.ZipFile(zip_pdf_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for r in results:
-            zf.write(r["pdf_path"], arcname=os.path.basename(r["pdf_path"]))
-    zip_pdf_url = _media_url(base_subdir, zip_pdf_name)
-
-    combined_pdf_name = "daily_logs_combined.pdf"
-    combined_pdf_path = os.path.join(out_dir, combined_pdf_name)
-    merger = PdfMerger()
-    for p in per_day_pdf_paths:
-        merger.append(p)
-    with open(combined_pdf_path, "wb") as f:
-        merger.write(f)
-    merger.close()
-    combined_pdf_url = _media_url(base_subdir, combined_pdf_name)
+            r["pages"] = page_map.get(r["date"].replace("/", "-"))
+    else:
+        # WeasyPrint layout is CPU-bound: pages render concurrently, results stay in date order
+        _render_pdfs(pdf_jobs)
+        for key, (_, path) in zip(pdf_keys, pdf_jobs):
+            render_cache.store(key, ".pdf", path)
+
+    # archives are streamed on download (TripDownloadView); drop ones left by older renders
+    for stale in LEGACY_ZIP_NAMES:
+        render_cache.unlink(os.path.join(out_dir, stale))
+
+    if not book_mode:
+        merger = PdfMerger()
+        for p in per_day_pdf_paths:
+            merger.append(p)
+        with open(combined_pdf_path, "wb") as f:
+            merger.write(f)
+        merger.close()
+    combined_pdf_url = _media_url(base_subdir, COMBINED_PDF_NAME)
+
+    extra = [("combined", combined_pdf_path)] + ([("pagemap", page_map_path)] if book_mode else [])
+    catalog.record_render(trip, results, extra)
 
     results.append(
         {
-            "zip_html_path": zip_html_path,
-            "zip_html_url": zip_html_url,
-            "zip_pdf_path": zip_pdf_path,
-            "zip_pdf_url": zip_pdf_url,
             "combined_pdf_path": combined_pdf_path,
             "combined_pdf_url": combined_pdf_url,
         }
     )
 
+    render_cache.maybe_prune()
     return results
@@ -0,0 +1,98 @@
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from ..models import RouteGeometry
+from .geometry import RESOLUTIONS, clip_to_bbox, decode_polyline, encode_polyline, simplify
+
+PRECISION = 6
+
+
+def _levels(coords) -> Dict[str, str]:
+    return {name: encode_polyline(simplify(coords, tol), PRECISION) for name, tol in RESOLUTIONS.items() if tol > 0}
+
+
+def _encoded(geometry: Dict[str, Any]) -> Tuple[list, str, str]:
+    """(coords, encoded polyline, content digest) of a GeoJSON LineString."""
+    coords = (geometry or {}).get("coordinates") or []
+    encoded = encode_polyline(coords, PRECISION)
+    digest = hashlib.sha256(f"{PRECISION}:{encoded}".encode("ascii")).hexdigest()
+    return coords, encoded, digest
+
+
+def _defaults(coords, encoded: str, bbox=None) -> Dict[str, Any]:
+    return {
+        "encoded": encoded,
+        "precision": PRECISION,
+        "num_points": len(coords),
+        "bbox": bbox or [],
+        "levels": _levels(coords),
+    }
+
+
+def store_route_geometry(geometry: Dict[str, Any], bbox=None) -> RouteGeometry:
+    """
+    Persist a GeoJSON LineString once (deduplicated by content) together with
+    its precomputed simplified levels, and return its row. The levels are only
+    computed when the route is new.
+    """
+    coords, encoded, digest = _encoded(geometry)
+    # bump before reading: purge_drafts only deletes rows unused for the whole TTL
+    row = None
+    if RouteGeometry.objects.filter(digest=digest).update(last_used_at=timezone.now()):
+        row = RouteGeometry.objects.filter(digest=digest).first()
+    if row is None:
+        row, _ = RouteGeometry.objects.get_or_create(digest=digest, defaults=_defaults(coords, encoded, bbox))
+    return row
+
+
+async def astore_route_geometry(geometry: Dict[str, Any], bbox=None) -> RouteGeometry:
+    # encoding + simplification is CPU work; keep it off the event loop
+    coords, encoded, digest = await sync_to_async(_encoded, thread_sensitive=False)(geometry)
+    row = None
+    if await RouteGeometry.objects.filter(digest=digest).aupdate(last_used_at=timezone.now()):
+        row = await RouteGeometry.objects.filter(digest=digest).afirst()
+    if row is None:
+        defaults = await sync_to_async(_defaults, thread_sensitive=False)(coords, encoded, bbox)
+        row, _ = await RouteGeometry.objects.aget_or_create(digest=digest, defaults=defaults)
+    return row
+
+
+def geometry_coords(row: RouteGeometry, resolution: str = "full") -> List[List[float]]:
+    if resolution == "full" or resolution not in RESOLUTIONS:
+        return decode_polyline(row.encoded, row.precision)
+    encoded = (row.levels or {}).get(resolution)
+    if encoded is None:
+        # rows stored before levels existed: simplify in memory; reads never write
+        simplified = simplify(decode_polyline(row.encoded, row.precision), RESOLUTIONS[resolution])
+        encoded = encode_polyline(simplified, row.precision)
+    return decode_polyline(encoded, row.precision)
+
+
+def geometry_geojson(row: RouteGeometry, resolution: str = "full", bbox=None) -> Dict[str, Any]:
+    """LineString at the given resolution; MultiLineString of the visible parts when a bbox is given."""
+    coords = geometry_coords(row, resolution)
+    if bbox is None:
+        return {"type": "LineString", "coordinates": coords}
+    return {"type": "MultiLineString", "coordinates": clip_to_bbox(coords, bbox)}
+
+
+def compact_payload(payload: Dict[str, Any], row: RouteGeometry) -> Dict[str, Any]:
+    """Copy of a plan payload whose route references `row` instead of embedding the geometry."""
+    route = {k: v for k, v in (payload.get("route") or {}).items() if k != "geometry"}
+    route["geometry_id"] = str(row.id)
+    return {**payload, "route": route}
+
+
+def hydrate_payload(
+    payload: Optional[Dict[str, Any]], row: Optional[RouteGeometry], resolution: str = "full"
+) -> Optional[Dict[str, Any]]:
+    """Inverse of compact_payload for read paths that need the geometry (maps)."""
+    if not payload or row is None:
+        return payload
+    route = payload.get("route") or {}
+    if "geometry" in route:
+        return payload
+    return {**payload, "route": {**route, "geometry": geometry_geojson(row, resolution)}}
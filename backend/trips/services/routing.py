@@ -1,18 +1,151 @@
-import httpx
+from django.conf import settings
+
+from .cache import TieredCache, make_key
+from .http_client import arequest, request
 
 OSRM = "https://router.project-osrm.org"
 
 
-def osrm_route(points):  # points: [(lng,lat), ...]
+def _route_bytes(result) -> int:
+    """
+    Approximate memory held by a parsed route: ~128 bytes per [lng, lat] pair
+    and ~32 per annotation number, counted without walking the lists.
+    """
+    coords = len(((result or {}).get("geometry") or {}).get("coordinates") or [])
+    numbers = sum(
+        len(values)
+        for leg in ((result or {}).get("raw") or {}).get("legs") or []
+        for values in (leg.get("annotation") or {}).values()
+        if isinstance(values, list)
+    )
+    return 4096 + 128 * coords + 32 * numbers
+
+
+_route_cache = TieredCache(
+    "osrm-route",
+    alias=getattr(settings, "ROUTE_CACHE_ALIAS", "routes"),
+    lru_size=getattr(settings, "ROUTE_CACHE_LRU_SIZE", 256),
+    lru_bytes=getattr(settings, "ROUTE_CACHE_LRU_BYTES", 64 * 1024 * 1024),
+    sizeof=_route_bytes,
+)
+
+_table_cache = TieredCache(
+    "osrm-table",
+    alias=getattr(settings, "TABLE_CACHE_ALIAS", "tables"),
+    lru_size=getattr(settings, "TABLE_CACHE_LRU_SIZE", 0),
+)
+
+
+def _round_points(points, precision):
+    return [(round(float(lng), precision), round(float(lat), precision)) for lng, lat in points]
+
+
+def route_cache_stats():
+    return _route_cache.stats()
+
+
+def table_cache_stats():
+    return _table_cache.stats()
+
+
+def _route_request(points, profile):
+    points = _round_points(points, getattr(settings, "ROUTE_CACHE_PRECISION", 5))
     coords = ";".join([f"{lng},{lat}" for lng, lat in points])
-    url = f"{OSRM}/route/v1/driving/{coords}?overview=full&geometries=geojson&steps=true&annotations=distance,duration"
-    with httpx.Client(timeout=20) as client:
-        r = client.get(url, headers={"User-Agent": "eld-app/1.0"})
-        r.raise_for_status()
-        data = r.json()
+    url = f"{OSRM}/route/v1/{profile}/{coords}?overview=full&geometries=geojson&annotations=distance,duration"
+    return make_key(profile, coords), url
+
+
+def route_key(points, profile="driving"):
+    """Cache key of the OSRM route through `points`; equal keys mean the same upstream request."""
+    return _route_request(points, profile)[0]
+
+
+def _parse_route(data):
     route = data["routes"][0]
     geom = route["geometry"]  # GeoJSON LineString
     dist = int(route["distance"])
     dur = int(route["duration"])
     bbox = route.get("bbox") or []
     return {"geometry": geom, "distance_m": dist, "duration_s": dur, "bbox": bbox, "raw": route}
+
+
+def osrm_route(points, profile="driving"):  # points: [(lng,lat), ...]
+    cache_key, url = _route_request(points, profile)
+    cached = _route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    r = request("GET", url)
+    r.raise_for_status()
+    result = _parse_route(r.json())
+    _route_cache.set(cache_key, result)
+    return result
+
+
+async def aosrm_route(points, profile="driving"):
+    cache_key, url = _route_request(points, profile)
+    cached = await _route_cache.aget(cache_key)
+    if cached is not None:
+        return cached
+
+    r = await arequest("GET", url)
+    r.raise_for_status()
+    result = _parse_route(r.json())
+    await _route_cache.aset(cache_key, result)
+    return result
+
+
+def _chunks(seq, size):
+    return [seq[i : i + size] for i in range(0, len(seq), size)]
+
+
+def _fetch_table(sources, destinations, profile):
+    coords = ";".join(f"{lng},{lat}" for lng, lat in list(sources) + list(destinations))
+    src = ";".join(str(i) for i in range(len(sources)))
+    dst = ";".join(str(len(sources) + j) for j in range(len(destinations)))
+    url = f"{OSRM}/table/v1/{profile}/{coords}?sources={src}&destinations={dst}&annotations=duration,distance"
+    r = request("GET", url)
+    r.raise_for_status()
+    data = r.json()
+    return data["durations"], data["distances"]
+
+
+def osrm_table(sources, destinations, profile="driving"):  # sources/destinations: [(lng,lat), ...]
+    """
+    Driving duration (s) and distance (m) matrices from every source to every
+    destination via OSRM /table; unreachable pairs are None.
+
+    Cells are cached one by one, so only the rows x columns holding uncached
+    cells go upstream, split into requests of at most OSRM_TABLE_MAX_COORDS
+    coordinates.
+    """
+    precision = getattr(settings, "ROUTE_CACHE_PRECISION", 5)
+    src = _round_points(sources, precision)
+    dst = _round_points(destinations, precision)
+    keys = [[make_key(profile, s, t) for t in dst] for s in src]
+    cached = _table_cache.get_many([k for row in keys for k in row])
+
+    durations = [[None] * len(dst) for _ in src]
+    distances = [[None] * len(dst) for _ in src]
+    miss_rows, miss_cols = set(), set()
+    for i, row in enumerate(keys):
+        for j, key in enumerate(row):
+            if key in cached:
+                durations[i][j], distances[i][j] = cached[key]
+            else:
+                miss_rows.add(i)
+                miss_cols.add(j)
+    if not miss_rows:
+        return {"durations": durations, "distances": distances}
+
+    block = max(1, getattr(settings, "OSRM_TABLE_MAX_COORDS", 100) // 2)
+    fresh = {}
+    for rows in _chunks(sorted(miss_rows), block):
+        for cols in _chunks(sorted(miss_cols), block):
+            dur, dist = _fetch_table([src[i] for i in rows], [dst[j] for j in cols], profile)
+            for a, i in enumerate(rows):
+                for b, j in enumerate(cols):
+                    durations[i][j], distances[i][j] = dur[a][b], dist[a][b]
+                    fresh[keys[i][j]] = (dur[a][b], dist[a][b])
+    _table_cache.set_many(fresh)
+    return {"durations": durations, "distances": distances}
@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+
+from ..models import Trip, TripSummary
+
+
+def _name(places: Dict[str, Any], key: str) -> str:
+    return ((places.get(key) or {}).get("name") or "")[:255]
+
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def summary_fields(calc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """TripSummary columns from a calc_payload."""
+    calc = calc or {}
+    places = calc.get("places") or {}
+    route = calc.get("route") or {}
+    stats = calc.get("stats") or {}
+    return {
+        "current_location": _name(places, "current"),
+        "pickup_location": _name(places, "pickup"),
+        "dropoff_location": _name(places, "dropoff"),
+        "distance_m": _number(route.get("distance_m")),
+        "duration_s": _number(route.get("duration_s")),
+        "cycle_hours_used_after": _number(stats.get("cycle_hours_used_after")),
+    }
+
+
+def record_summary(trip: Trip) -> TripSummary:
+    """Create or refresh the trip's summary row; call whenever calc_payload is written."""
+    summary, _ = TripSummary.objects.update_or_create(
+        trip=trip,
+        defaults={"user_id": trip.user_id, "created_at": trip.created_at, **summary_fields(trip.calc_payload)},
+    )
+    return summary
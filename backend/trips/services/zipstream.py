@@ -0,0 +1,177 @@
+import hashlib
+import re
+import struct
+import zlib
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+CHUNK = 64 * 1024
+
+STORED = 0
+DEFLATED = 8
+
+# fixed DOS timestamp (1980-01-01 00:00) so the same files always give the same bytes
+_DOS_TIME = 0
+_DOS_DATE = (0 << 9) | (1 << 5) | 1
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (arcname, path, method, crc32, compressed size, uncompressed size)
+Entry = Tuple[str, str, int, int, int, int]
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _deflate_chunks(path: str) -> Iterator[bytes]:
+    comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+    for chunk in _read_chunks(path):
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+def archive_etag(files: Sequence[Tuple[str, str, str]], method_for=None) -> str:
+    """Strong ETag from the (arcname, path, content checksum) members; touches no files."""
+    h = hashlib.sha256()
+    for arcname, _, digest in files:
+        method = method_for(arcname) if method_for else STORED
+        h.update(f"{arcname}\0{digest}\0{method}\n".encode("utf-8"))
+    return f'"{h.hexdigest()[:32]}"'
+
+
+def scan(files: Sequence[Tuple[str, ...]], method_for=None) -> List[Entry]:
+    """
+    Counting pass: CRC and compressed/uncompressed sizes of every (arcname,
+    path, ...) member, so the archive's exact length and byte layout are known
+    before streaming.
+    """
+    entries = []
+    for arcname, path, *_ in files:
+        method = method_for(arcname) if method_for else STORED
+        crc = size = 0
+        for chunk in _read_chunks(path):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+        csize = size if method == STORED else sum(len(c) for c in _deflate_chunks(path))
+        entries.append((arcname, path, method, crc, csize, size))
+    return entries
+
+
+class ZipStream:
+    """
+    A zip archive laid out from scanned entries and produced on the fly with
+    bounded memory (CHUNK-sized reads). Sizes and CRCs sit in the local headers,
+    so no data descriptors are needed and any byte range can be served.
+    """
+
+    def __init__(self, entries: Sequence[Entry]):
+        self.parts = []  # (length, kind, payload): kind "bytes" | "stored" | "deflated"
+        central = []
+        offset = 0
+        for arcname, path, method, crc, csize, usize in entries:
+            name = arcname.encode("utf-8")
+            header = struct.pack(
+                "<IHHHHHIIIHH", 0x04034B50, 20, 0x800, method, _DOS_TIME, _DOS_DATE, crc, csize, usize, len(name), 0
+            )
+            central.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    20,
+                    20,
+                    0x800,
+                    method,
+                    _DOS_TIME,
+                    _DOS_DATE,
+                    crc,
+                    csize,
+                    usize,
+                    len(name),
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    offset,
+                )
+                + name
+            )
+            self.parts.append((len(header) + len(name), "bytes", header + name))
+            self.parts.append((csize, "stored" if method == STORED else "deflated", path))
+            offset += len(header) + len(name) + csize
+        directory = b"".join(central)
+        end = struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0)
+        self.parts.append((len(directory) + len(end), "bytes", directory + end))
+        self.size = sum(length for length, _, _ in self.parts)
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) of the archive."""
+        end = self.size - 1 if end is None else end
+        pos = 0
+        for length, kind, payload in self.parts:
+            part_start, part_end = pos, pos + length - 1
+            pos += length
+            if length == 0 or part_end < start:
+                continue
+            if part_start > end:
+                return
+            lo = max(start, part_start) - part_start
+            hi = min(end, part_end) - part_start + 1
+            if kind == "bytes":
+                yield payload[lo:hi]
+            elif kind == "stored":
+                yield from self._stored_slice(payload, lo, hi)
+            else:
+                yield from self._slice(_deflate_chunks(payload), lo, hi)
+
+    @staticmethod
+    def _stored_slice(path: str, lo: int, hi: int) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            f.seek(lo)
+            remaining = hi - lo
+            while remaining > 0:
+                chunk = f.read(min(CHUNK, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+    @staticmethod
+    def _slice(chunks: Iterator[bytes], lo: int, hi: int) -> Iterator[bytes]:
+        pos = 0
+        for chunk in chunks:
+            c_start, pos = pos, pos + len(chunk)
+            if pos <= lo:
+                continue
+            if c_start >= hi:
+                return
+            yield chunk[max(lo - c_start, 0) : hi - c_start]
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) for a single "bytes=" range; None to send the whole body
+    (absent, malformed or multi-range). Raises ValueError if unsatisfiable.
+    """
+    m = _RANGE_RE.match((header or "").strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):
+        suffix = int(m.group(2))
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        return max(size - suffix, 0), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
@@ -1,3 +1,902 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from PyPDF2 import PdfReader, PdfWriter
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import helpers
+from .models import RenderJob, RouteGeometry, Trip, TripCalcDraft, TripFile, TripLogFile, TripSummary
+from .services import (
+    cache,
+    catalog,
+    drafts,
+    hos,
+    http_client,
+    jobs,
+    overpass,
+    render_cache,
+    rendering,
+    route_store,
+    routing,
+    zipstream,
+)
+from .services.summary import record_summary, summary_fields
+from .services.geometry import RESOLUTIONS, clip_to_bbox, decode_polyline, encode_polyline, simplify
+
+START = datetime(2025, 9, 16, 8, tzinfo=timezone.utc)
+H = 3600
+MIN = 60
+
+
+def _stops(plan, type_):
+    return [e for e in plan.events if e.type == type_]
+
+
+class HosSimulateTests(SimpleTestCase):
+    def test_no_break_at_exactly_8h_driving(self):
+        plan = hos.simulate(8 * H, START)
+        self.assertEqual(_stops(plan, "break"), [])
+        self.assertEqual([e.type for e in plan.events], ["dropoff"])
+
+    def test_break_after_8h_driving(self):
+        plan = hos.simulate(8 * H + MIN, START)
+        breaks = _stops(plan, "break")
+        self.assertEqual(len(breaks), 1)
+        self.assertAlmostEqual(breaks[0].drive_s, 8 * H)
+        self.assertEqual(breaks[0].duration_min, hos.BREAK_MIN)
+        self.assertEqual(breaks[0].status, "OFF")
+
+    def test_long_stop_counts_as_break(self):
+        # the 1h pickup after 4h of driving resets the 8h clock
+        plan = hos.simulate(10 * H, START, pickup_drive_s=4 * H)
+        self.assertEqual(_stops(plan, "break"), [])
+
+    def test_11h_driving_limit(self):
+        at_limit = hos.simulate(11 * H, START)
+        self.assertEqual(_stops(at_limit, "rest"), [])
+
+        over = hos.simulate(11 * H + MIN, START)
+        rests = _stops(over, "rest")
+        self.assertEqual(len(rests), 1)
+        self.assertAlmostEqual(rests[0].drive_s, 11 * H)
+        self.assertEqual(rests[0].duration_min, hos.REST_MIN)
+        self.assertIn("11h", rests[0].note)
+
+    def test_14h_window(self):
+        # 1h pickup + 6 x 20m fuel + 30m break leave 2.5h of window after 8h driving
+        fuel = [n * H for n in range(1, 7)]
+        at_limit = hos.simulate(10.5 * H, START, pickup_drive_s=0, fuel_drive_s=fuel)
+        self.assertEqual(_stops(at_limit, "rest"), [])
+
+        over = hos.simulate(10.5 * H + MIN, START, pickup_drive_s=0, fuel_drive_s=fuel)
+        rests = _stops(over, "rest")
+        self.assertEqual(len(rests), 1)
+        self.assertAlmostEqual(rests[0].drive_s, 10.5 * H)
+        self.assertIn("14h", rests[0].note)
+        self.assertEqual((rests[0].start - START).total_seconds(), 14 * H)
+
+    def test_70h_cycle(self):
+        at_limit = hos.simulate(1 * H, START, cycle_used_h=69)
+        self.assertEqual(_stops(at_limit, "rest"), [])
+
+        over = hos.simulate(1 * H + MIN, START, cycle_used_h=69)
+        rests = _stops(over, "rest")
+        self.assertEqual(len(rests), 1)
+        self.assertAlmostEqual(rests[0].drive_s, 1 * H)
+        self.assertEqual(rests[0].duration_min, hos.RESTART_MIN)
+
+    def test_34h_restart_resets_cycle(self):
+        plan = hos.simulate(2 * H, START, cycle_used_h=69)
+        # after the restart: the remaining 1h of driving plus the 1h dropoff
+        self.assertAlmostEqual(plan.cycle_used_s, 2 * H)
+
+    def test_cycle_accumulates_without_restart(self):
+        plan = hos.simulate(5 * H, START, cycle_used_h=10, pickup_drive_s=0)
+        self.assertAlmostEqual(plan.cycle_used_s, 10 * H + 5 * H + 2 * H)
+
+    def test_fuel_stops_at_scheduled_points(self):
+        plan = hos.simulate(6 * H, START, fuel_drive_s=[2 * H, 4 * H, 0, 6 * H, 7 * H])
+        fuel = _stops(plan, "fuel")
+        self.assertEqual(plan.fuel_stops, 2)
+        self.assertEqual([e.drive_s for e in fuel], [2 * H, 4 * H])
+        self.assertTrue(all(e.duration_min == hos.FUEL_MIN and e.status == "ONDUTY" for e in fuel))
+
+    def test_segments_are_contiguous_and_add_up(self):
+        plan = hos.simulate(30 * H, START, pickup_drive_s=2 * H, fuel_drive_s=[12 * H, 24 * H])
+        for prev, nxt in zip(plan.segments, plan.segments[1:]):
+            self.assertEqual(prev.end, nxt.start)
+        total = (plan.segments[-1].end - plan.segments[0].start).total_seconds()
+        self.assertAlmostEqual(total, plan.drive_s + plan.on_duty_s + plan.off_duty_s)
+        self.assertAlmostEqual(plan.drive_s, 30 * H)
+
+
+def _method(arcname):
+    return zipstream.STORED if arcname.endswith(".pdf") else zipstream.DEFLATED
+
+
+class ZipStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.files = []
+        for name, data in (("a.html", b"<p>day one</p>" * 500), ("b.pdf", os.urandom(3000)), ("empty.html", b"")):
+            path = os.path.join(self.dir, name)
+            with open(path, "wb") as f:
+                f.write(data)
+            self.files.append((name, path, data))
+
+    def _archive(self):
+        return zipstream.ZipStream(zipstream.scan(self.files, _method))
+
+    def test_archive_opens_with_zipfile(self):
+        archive = self._archive()
+        body = b"".join(archive.iter_bytes())
+        self.assertEqual(len(body), archive.size)
+        with zipfile.ZipFile(io.BytesIO(body)) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.namelist(), ["a.html", "b.pdf", "empty.html"])
+            self.assertEqual(z.getinfo("a.html").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(z.getinfo("b.pdf").compress_type, zipfile.ZIP_STORED)
+            for name, _, data in self.files:
+                self.assertEqual(z.read(name), data)
+
+    def test_output_is_byte_identical_across_runs(self):
+        self.assertEqual(b"".join(self._archive().iter_bytes()), b"".join(self._archive().iter_bytes()))
+        self.assertEqual(zipstream.archive_etag(self.files, _method), zipstream.archive_etag(self.files, _method))
+
+    def test_byte_ranges_match_the_full_body(self):
+        archive = self._archive()
+        body = b"".join(archive.iter_bytes())
+        for start in range(0, archive.size, 997):
+            end = min(start + 996, archive.size - 1)
+            self.assertEqual(b"".join(archive.iter_bytes(start, end)), body[start : end + 1])
+
+    def test_parse_range(self):
+        self.assertIsNone(zipstream.parse_range(None, 100))
+        self.assertIsNone(zipstream.parse_range("bytes=0-1,5-6", 100))
+        self.assertEqual(zipstream.parse_range("bytes=10-", 100), (10, 99))
+        self.assertEqual(zipstream.parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(zipstream.parse_range("bytes=90-500", 100), (90, 99))
+        with self.assertRaises(ValueError):
+            zipstream.parse_range("bytes=100-", 100)
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0)
+class TripDownloadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_override = override_settings(MEDIA_ROOT=media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.trip = Trip.objects.create(user=user, calc_payload={})
+        logs = os.path.join(media, "trips", str(self.trip.id), "logs")
+        os.makedirs(logs)
+        days = []
+        for date in ("2025-09-16", "2025-09-17"):
+            path = os.path.join(logs, f"log-{date}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"<h1>{date}</h1>" * 200)
+            days.append({"html_path": path})
+        catalog.record_render(self.trip, days)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f"/api/trips/{self.trip.id}/download?format=html"
+
+    def _get(self, **headers):
+        resp = self.client.get(self.url, **headers)
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, body
+
+    def test_zip_download_is_deterministic(self):
+        resp, body = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(int(resp["Content-Length"]), len(body))
+        with zipfile.ZipFile(io.BytesIO(body)) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.namelist(), ["log-2025-09-16.html", "log-2025-09-17.html"])
+        again, body_again = self._get()
+        self.assertEqual(body_again, body)
+        self.assertEqual(again["ETag"], resp["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        resp, _ = self._get()
+        not_modified, _ = self._get(HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_range_returns_206(self):
+        _, body = self._get()
+        resp, part = self._get(HTTP_RANGE="bytes=10-99")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], f"bytes 10-99/{len(body)}")
+        self.assertEqual(part, body[10:100])
+
+    def test_stale_if_range_returns_full_body(self):
+        _, body = self._get()
+        resp, full = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(full, body)
+
+    def test_unsatisfiable_range_returns_416(self):
+        _, body = self._get()
+        resp, _ = self._get(HTTP_RANGE=f"bytes={len(body)}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(body)}")
+
+
+# a wiggly ~1000-point line across the western US, [lng, lat]
+LINE = [[-118.0 + i * 0.004, 34.0 + 0.002 * i + 0.01 * ((i * 7) % 5)] for i in range(1000)]
+
+
+class RecordRenderAfterDeleteTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_override = override_settings(MEDIA_ROOT=self.media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_render_finishing_after_delete_leaves_nothing(self):
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        trip = Trip.objects.create(user=user, calc_payload={})
+        client = APIClient()
+        client.force_authenticate(user)
+
+        # the render has written its files but not catalogued them when the trip is deleted
+        trip_dir = os.path.join(self.media, "trips", str(trip.id))
+        logs = os.path.join(trip_dir, "logs")
+        os.makedirs(logs)
+        days = []
+        for date in ("2025-09-16", "2025-09-17"):
+            day = {}
+            for fmt in ("html", "pdf"):
+                day[f"{fmt}_path"] = os.path.join(logs, f"log-{date}.{fmt}")
+                with open(day[f"{fmt}_path"], "w", encoding="utf-8") as f:
+                    f.write(date)
+            days.append(day)
+        combined = os.path.join(logs, "daily_logs_combined.pdf")
+        with open(combined, "w", encoding="utf-8") as f:
+            f.write("book")
+
+        self.assertEqual(client.delete(f"/api/trips/{trip.id}").status_code, 204)
+        self.assertFalse(catalog.record_render(trip, days, [("combined", combined)]))
+
+        self.assertFalse(TripFile.objects.filter(trip_id=trip.id).exists())
+        self.assertFalse(TripLogFile.objects.filter(trip_id=trip.id).exists())
+        self.assertFalse(os.path.exists(trip_dir))
+
+
+SUMMARY_PAYLOADS = [
+    {
+        "places": {"current": {"name": "Dallas, TX"}, "pickup": {"name": "Tulsa, OK"}, "dropoff": {"name": "x" * 300}},
+        "route": {"distance_m": 812345.5, "duration_s": 30000},
+        "stats": {"cycle_hours_used_after": 21.25},
+    },
+    {"places": {"current": None, "pickup": {"name": None}}, "route": {"distance_m": True, "duration_s": "9"}},
+    {},
+]
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0)
+class TripSummaryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _columns(self, summary):
+        return {k: getattr(summary, k) for k in summary_fields(None)}
+
+    def test_summary_follows_trip_create_and_delete(self):
+        draft = TripCalcDraft.objects.create(user=self.user, payload=SUMMARY_PAYLOADS[0])
+        resp = self.client.post("/api/trips", {"draft_id": str(draft.id)}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        trip = Trip.objects.get(pk=resp.json()["id"])
+        summary = TripSummary.objects.get(trip=trip)
+        self.assertEqual((summary.user_id, summary.created_at), (trip.user_id, trip.created_at))
+        self.assertEqual(self._columns(summary), summary_fields(SUMMARY_PAYLOADS[0]))
+        self.assertEqual(len(summary.dropoff_location), 255)
+
+        self.assertEqual(self.client.delete(f"/api/trips/{trip.id}").status_code, 204)
+        self.assertFalse(TripSummary.objects.filter(trip_id=trip.id).exists())
+
+    def test_backfill_matches_summary_fields(self):
+        backfill = importlib.import_module("trips.migrations.0006_trip_summary")
+        trips = [Trip.objects.create(user=self.user, calc_payload=payload) for payload in SUMMARY_PAYLOADS]
+        for payload in SUMMARY_PAYLOADS + [None]:
+            self.assertEqual(backfill.summary_fields(payload), summary_fields(payload))
+
+        backfill.backfill_summaries(django_apps, None)
+        for trip in trips:
+            summary = TripSummary.objects.get(trip=trip)
+            self.assertEqual((summary.user_id, summary.created_at), (trip.user_id, trip.created_at))
+            self.assertEqual(self._columns(summary), summary_fields(trip.calc_payload))
+
+
+class BookPdfCutTests(TestCase):
+    DATES = ("2025-09-16", "2025-09-17", "2025-09-18")
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_override = override_settings(MEDIA_ROOT=media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.trip = Trip.objects.create(user=user, calc_payload={})
+        self.logs = os.path.join(media, "trips", str(self.trip.id), "logs")
+        os.makedirs(self.logs)
+        writer = PdfWriter()
+        for _ in range(4):
+            writer.add_blank_page(width=612, height=792)
+        combined = os.path.join(self.logs, rendering.COMBINED_PDF_NAME)
+        with open(combined, "wb") as f:
+            writer.write(f)
+        page_map = os.path.join(self.logs, rendering.PAGE_MAP_NAME)
+        with open(page_map, "w", encoding="utf-8") as f:
+            json.dump(dict(zip(self.DATES, ([0, 1], [2, 2], [3, 3]))), f)
+        catalog.record_render(self.trip, [], [("combined", combined), ("pagemap", page_map)])
+
+    def test_log_files_parses_the_book_once(self):
+        with mock.patch.object(rendering, "PdfReader", wraps=rendering.PdfReader) as reader:
+            files = rendering.log_files(self.trip, "pdf")
+        self.assertEqual(reader.call_count, 1)
+        self.assertEqual([name for name, _, _ in files], [f"log-{d}.pdf" for d in self.DATES])
+        self.assertEqual([len(PdfReader(path).pages) for _, path, _ in files], [2, 1, 1])
+        with mock.patch.object(rendering, "PdfReader") as reader:
+            self.assertEqual(len(rendering.log_files(self.trip, "pdf")), 3)
+            self.assertEqual(rendering.day_pdf_path(self.trip, "2025-09-17"), files[1][1])
+        reader.assert_not_called()
+
+    def test_day_missing_from_page_map(self):
+        self.assertIsNone(rendering.day_pdf_path(self.trip, "2025-09-19"))
+
+
+class RenderCacheTests(SimpleTestCase):
+    DAY = 24 * 3600
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        cache_override = override_settings(RENDER_CACHE_DIR=os.path.join(self.dir, "cache"), RENDER_CACHE_ENABLED=True)
+        cache_override.enable()
+        self.addCleanup(cache_override.disable)
+
+    def _file(self, name, data=b"x" * 100):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _store(self, key, age_days=0):
+        src = self._file(f"trip-{key}.pdf")
+        render_cache.store(key, ".pdf", src)
+        entry = render_cache._entry(key, ".pdf")
+        when = time.time() - age_days * self.DAY
+        os.utime(entry, (when, when))
+        return src, entry
+
+    def test_store_and_fetch_share_the_file(self):
+        src, entry = self._store("aa01", age_days=5)
+        self.assertTrue(os.path.samefile(src, entry))
+        dest = os.path.join(self.dir, "other-trip.pdf")
+        self.assertTrue(render_cache.fetch("aa01", ".pdf", dest))
+        self.assertTrue(os.path.samefile(dest, entry))
+        self.assertGreater(os.stat(entry).st_mtime, time.time() - 60)  # fetch marks the entry used
+
+        # a second store keeps the existing entry; writers unlink before rewriting
+        render_cache.store("aa01", ".pdf", self._file("changed.pdf", b"y" * 100))
+        render_cache.unlink(dest)
+        self._file("other-trip.pdf", b"z" * 100)
+        with open(entry, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 100)
+
+        self.assertFalse(render_cache.fetch("bb02", ".pdf", os.path.join(self.dir, "missing.pdf")))
+        with override_settings(RENDER_CACHE_ENABLED=False):
+            self.assertFalse(render_cache.fetch("aa01", ".pdf", dest))
+
+    def test_prune_by_age_then_size(self):
+        old_src, old = self._store("aa01", age_days=40)
+        _, older = self._store("bb02", age_days=2)
+        _, newer = self._store("cc03", age_days=1)
+        _, newest = self._store("dd04")
+
+        self.assertEqual(render_cache.prune(max_bytes=250, max_age_s=30 * self.DAY), (2, 200))
+        self.assertEqual([os.path.exists(p) for p in (old, older, newer, newest)], [False, False, True, True])
+        # the trip's own link to the pruned entry is untouched
+        with open(old_src, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 100)
+        self.assertFalse(render_cache.fetch("aa01", ".pdf", os.path.join(self.dir, "again.pdf")))
+
+        self.assertEqual(render_cache.prune(max_bytes=250, max_age_s=30 * self.DAY), (0, 0))
+
+
+class PolylineTests(SimpleTestCase):
+    def test_round_trip_at_precision_6(self):
+        coords = [[-118.2436849, 34.0522342], [0.0, 0.0], [179.9999994, -89.9999996], [-0.0000005, 0.0000015]]
+        decoded = decode_polyline(encode_polyline(coords, 6), 6)
+        self.assertEqual(len(decoded), len(coords))
+        for (lng, lat), (dlng, dlat) in zip(coords, decoded):
+            self.assertAlmostEqual(dlng, round(lng, 6), places=9)
+            self.assertAlmostEqual(dlat, round(lat, 6), places=9)
+
+    def test_empty_line(self):
+        self.assertEqual(encode_polyline([], 6), "")
+        self.assertEqual(decode_polyline("", 6), [])
+
+    def test_simplify_keeps_endpoints(self):
+        for tolerance in RESOLUTIONS.values():
+            out = simplify(LINE, tolerance).tolist()
+            self.assertEqual(out[0], LINE[0])
+            self.assertEqual(out[-1], LINE[-1])
+            self.assertLessEqual(len(out), len(LINE))
+        self.assertEqual(simplify([[0, 0], [1, 1], [2, 2], [3, 3]], 0.001).tolist(), [[0, 0], [3, 3]])
+
+
+class RouteStoreTests(TestCase):
+    def setUp(self):
+        self.row = route_store.store_route_geometry({"type": "LineString", "coordinates": LINE}, [-118, 34, -114, 38])
+
+    def test_reused_route_skips_simplification(self):
+        with mock.patch.object(route_store, "_levels") as levels:
+            again = route_store.store_route_geometry({"type": "LineString", "coordinates": LINE})
+        levels.assert_not_called()
+        self.assertEqual(again.pk, self.row.pk)
+        self.assertEqual(RouteGeometry.objects.count(), 1)
+
+    def test_compact_and_hydrate_are_symmetric(self):
+        payload = {"route": {"geometry": {"type": "LineString", "coordinates": LINE}, "distance_m": 5.0}, "stops": []}
+        compact = route_store.compact_payload(payload, self.row)
+        self.assertNotIn("geometry", compact["route"])
+        self.assertEqual(compact["route"]["geometry_id"], str(self.row.id))
+        self.assertEqual(compact["stops"], [])
+
+        full = route_store.hydrate_payload(compact, self.row)["route"]["geometry"]
+        self.assertEqual(full["type"], "LineString")
+        self.assertEqual(full["coordinates"], decode_polyline(encode_polyline(LINE, 6), 6))
+        self.assertEqual(route_store.hydrate_payload(payload, self.row), payload)
+
+    def test_levels_and_bbox_clipping(self):
+        for name in ("high", "medium", "low"):
+            coords = route_store.geometry_coords(self.row, name)
+            self.assertEqual(coords, decode_polyline(self.row.levels[name], 6))
+            self.assertEqual(coords[0], route_store.geometry_coords(self.row)[0])
+        low = route_store.geometry_coords(self.row, "low")
+        self.assertLess(len(low), len(LINE))
+
+        # rows stored before levels existed give the same answer, without writing
+        RouteGeometry.objects.filter(pk=self.row.pk).update(levels={})
+        legacy = RouteGeometry.objects.get(pk=self.row.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(route_store.geometry_coords(legacy, "low"), low)
+
+        bbox = [-117.5, 34.0, -117.0, 40.0]
+        clipped = route_store.geometry_geojson(self.row, "full", bbox)
+        self.assertEqual(clipped["type"], "MultiLineString")
+        self.assertEqual(clipped["coordinates"], clip_to_bbox(route_store.geometry_coords(self.row), bbox))
+        self.assertTrue(
+            all(-117.5 - 0.005 <= lng <= -117.0 + 0.005 for run in clipped["coordinates"] for lng, _ in run)
+        )
+
+
+class DraftPurgeTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.old = datetime.now(timezone.utc) - timedelta(days=8)
+
+    def _geometry(self, coords, expired=True):
+        row = route_store.store_route_geometry({"type": "LineString", "coordinates": coords})
+        if expired:
+            RouteGeometry.objects.filter(pk=row.pk).update(created_at=self.old, last_used_at=self.old)
+        return row
+
+    def _draft(self, geom, expired=True, logged=False):
+        draft = TripCalcDraft.objects.create(user=self.user, payload={}, route_geometry=geom, is_logged=logged)
+        if expired:
+            TripCalcDraft.objects.filter(pk=draft.pk).update(created_at=self.old)
+        return draft
+
+    def test_purge_expired_unlogged_drafts_in_batches(self):
+        geom = self._geometry(LINE[:10], expired=False)
+        expired = [self._draft(geom) for _ in range(3)]
+        fresh = self._draft(geom, expired=False)
+        logged = self._draft(geom, logged=True)
+
+        self.assertEqual(drafts.purge(ttl_s=7 * 24 * 3600, batch=2), (3, 0))
+        self.assertFalse(TripCalcDraft.objects.filter(pk__in=[d.pk for d in expired]).exists())
+        self.assertEqual(set(TripCalcDraft.objects.values_list("pk", flat=True)), {fresh.pk, logged.pk})
+
+    def test_purge_orphan_geometries(self):
+        self._geometry(LINE[:10])  # orphan
+        used_by_trip = self._geometry(LINE[10:20])
+        Trip.objects.create(user=self.user, calc_payload={}, route_geometry=used_by_trip)
+        only_expired_drafts = self._geometry(LINE[20:30])
+        self._draft(only_expired_drafts)
+
+        self.assertEqual(drafts.purge(batch=1), (1, 2))
+        self.assertEqual(list(RouteGeometry.objects.values_list("pk", flat=True)), [used_by_trip.pk])
+
+    def test_reused_expired_geometry_survives_purge(self):
+        # an old orphan row handed out again by digest must not be purged before its draft exists
+        old = self._geometry(LINE[:10])
+        reused = route_store.store_route_geometry({"type": "LineString", "coordinates": LINE[:10]})
+        self.assertEqual(reused.pk, old.pk)
+        self.assertGreater(reused.last_used_at, self.old)
+
+        self.assertEqual(drafts.purge(), (0, 0))
+        self._draft(reused, expired=False)
+        self.assertTrue(RouteGeometry.objects.filter(pk=old.pk).exists())
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0, RENDER_JOB_STALE_S=900, RENDER_JOB_MAX_ATTEMPTS=3)
+class RenderJobTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.trip = Trip.objects.create(user=user, calc_payload={})
+
+    def _running(self, attempts, age_s):
+        started = datetime.now(timezone.utc) - timedelta(seconds=age_s)
+        return RenderJob.objects.create(
+            trip=self.trip, status=RenderJob.RUNNING, attempts=attempts, started_at=started, worker="gone"
+        )
+
+    def test_second_claimer_gets_nothing(self):
+        queued = RenderJob.objects.create(trip=self.trip)
+        job = jobs.claim_next("a")
+        self.assertEqual(job.pk, queued.pk)
+        self.assertEqual((job.status, job.attempts, job.worker), (RenderJob.RUNNING, 1, "a"))
+        self.assertIsNone(jobs.claim_next("b"))
+
+    def test_requeue_stale(self):
+        retry = self._running(attempts=1, age_s=3600)
+        exhausted = self._running(attempts=3, age_s=3600)
+        busy = self._running(attempts=1, age_s=60)
+
+        self.assertEqual(jobs.requeue_stale(), 2)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((retry.status, retry.worker), (RenderJob.QUEUED, ""))
+        self.assertEqual(exhausted.status, RenderJob.FAILED)
+        self.assertIn("stale", exhausted.error)
+        self.assertEqual(busy.status, RenderJob.RUNNING)
+
+    def test_can_retry(self):
+        self.assertTrue(jobs.can_retry(self.trip))
+        RenderJob.objects.create(trip=self.trip, status=RenderJob.FAILED, attempts=2)
+        self.assertTrue(jobs.can_retry(self.trip))
+        RenderJob.objects.create(trip=self.trip, status=RenderJob.FAILED, attempts=1)
+        self.assertFalse(jobs.can_retry(self.trip))
+
+    @override_settings(RENDER_JOB_RECOVER_INTERVAL_S=60)
+    def test_recovery_reschedules_after_an_error(self):
+        with (
+            mock.patch.object(jobs, "requeue_stale", side_effect=RuntimeError("database is locked")),
+            mock.patch.object(jobs.threading, "Timer") as timer,
+            self.assertLogs("trips.services.jobs", "ERROR"),
+        ):
+            jobs._recover()
+        timer.assert_called_once()
+        self.assertEqual(timer.call_args[0][0], 60)
+        timer.return_value.start.assert_called_once()
+
+
+def _trip_body(lng, cycle=10):
+    return {
+        "currentLocation": {"lat": 34.0, "lng": lng, "name": "Start"},
+        "pickupLocation": {"lat": 35.0, "lng": lng + 1, "name": "Pickup"},
+        "dropoffLocation": {"lat": 36.0, "lng": lng + 3, "name": "Dropoff"},
+        "currentCycleUsedHours": cycle,
+        "startTimeIso": "2025-09-16T08:00:00Z",
+    }
+
+
+def _fake_route(waypoints, *args, **kwargs):
+    lng = waypoints[0]["lng"] if isinstance(waypoints[0], dict) else waypoints[0][0]
+    coords = [[lng + i * 0.003, 34.0 + i * 0.002] for i in range(1000)]
+    return {
+        "geometry": {"type": "LineString", "coordinates": coords},
+        "distance_m": 400000.0,
+        "duration_s": 16000.0,
+        "bbox": [],
+        "raw": {},
+    }
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0)
+class TripBatchTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.routes = mock.Mock(side_effect=_fake_route)
+        for target, patch in (("osrm_route", self.routes), ("find_pois", mock.Mock(return_value=[]))):
+            patcher = mock.patch.object(helpers, target, patch)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _batch(self, items):
+        resp = self.client.post("/api/trip/calculate/batch", {"trips": items}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        return {line["index"]: line for line in lines}
+
+    def test_identical_items_share_one_draft(self):
+        lines = self._batch([_trip_body(-118), _trip_body(-118), _trip_body(-118)])
+        self.assertEqual(len({lines[i]["draft_id"] for i in range(3)}), 1)
+        self.assertEqual(TripCalcDraft.objects.count(), 1)
+
+        # a later batch reuses the draft instead of planning again
+        again = self._batch([_trip_body(-118)])
+        self.assertEqual(again[0]["draft_id"], lines[0]["draft_id"])
+        self.assertEqual(TripCalcDraft.objects.count(), 1)
+        self.assertEqual(self.routes.call_count, 1)
+
+    def test_distinct_routes_fetch_once_each(self):
+        items = [_trip_body(-118), _trip_body(-110), _trip_body(-118, cycle=20), _trip_body(-110)]
+        lines = self._batch(items)
+        self.assertEqual(self.routes.call_count, 2)
+        self.assertEqual(TripCalcDraft.objects.count(), 3)
+        self.assertEqual(lines[1]["draft_id"], lines[3]["draft_id"])
+        self.assertNotEqual(lines[0]["draft_id"], lines[2]["draft_id"])
+        self.assertEqual(lines[0]["route"]["geometry_id"], lines[2]["route"]["geometry_id"])
+
+    def test_invalid_item_reports_error_and_stream_continues(self):
+        lines = self._batch([_trip_body(-118), {"currentLocation": "nowhere"}, _trip_body(-110)])
+        self.assertEqual(sorted(lines), [0, 1, 2])
+        self.assertIn("errors", lines[1])
+        self.assertNotIn("draft_id", lines[1])
+        self.assertIn("draft_id", lines[0])
+        self.assertIn("draft_id", lines[2])
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0, TRIP_LIST_MAX_LIMIT=3, TRIP_LIST_MAX_OFFSET=5)
+class TripListPaginationTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        other = get_user_model().objects.create_user(username="other@example.com", password="x")
+        Trip.objects.create(user=other, calc_payload={})
+        base = datetime(2025, 9, 1, tzinfo=timezone.utc)
+        self.trips = []
+        for i in range(8):
+            trip = Trip.objects.create(user=user, calc_payload={})
+            # trips 2-5 share one timestamp, so their order falls back to id
+            created = base + timedelta(hours=2 if 2 <= i <= 5 else i)
+            Trip.objects.filter(pk=trip.pk).update(created_at=created)
+            self.trips.append(trip.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _expected(self, sort="-created"):
+        qs = Trip.objects.filter(pk__in=self.trips)
+        order = ["-created_at", "-id"] if sort.startswith("-") else ["created_at", "id"]
+        return [str(pk) for pk in qs.order_by(*order).values_list("pk", flat=True)]
+
+    def _get(self, **params):
+        resp = self.client.get("/api/trips", params)
+        return resp, resp.json()
+
+    def _walk(self, sort):
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 3, "sort": sort}
+            if cursor:
+                params["cursor"] = cursor
+            resp, data = self._get(**params)
+            self.assertEqual(resp.status_code, 200)
+            pages.append(data)
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def test_cursor_walks_forward_and_back_without_gaps(self):
+        for sort in ("-created", "created"):
+            pages = self._walk(sort)
+            ids = [row["id"] for page in pages for row in page["results"]]
+            self.assertEqual(ids, self._expected(sort))
+            self.assertIsNone(pages[0]["prev_cursor"])
+
+            # and back from the last page to the first
+            back, cursor = [pages[-1]["results"]], pages[-1]["prev_cursor"]
+            while cursor:
+                _, data = self._get(limit=3, sort=sort, cursor=cursor)
+                back.insert(0, data["results"])
+                cursor = data["prev_cursor"]
+            self.assertEqual([row["id"] for page in back for row in page], self._expected(sort))
+
+    def test_equal_timestamps_break_ties_by_id(self):
+        tied = sorted(str(pk) for pk in self.trips[2:6])
+        ids = [row["id"] for page in self._walk("created") for row in page["results"]]
+        self.assertEqual([i for i in ids if i in tied], tied)
+
+    def test_bad_cursor(self):
+        for cursor in ("garbage", "W10", "WyJ4IiwgInkiLCAibiJd"):
+            resp, _ = self._get(cursor=cursor)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_limit_is_clamped(self):
+        _, data = self._get(limit=50)
+        self.assertEqual(len(data["results"]), 3)
+
+    def test_count_defaults(self):
+        _, first = self._get()
+        self.assertEqual((first["count"], first["count_exact"]), (8, True))
+        _, later = self._get(cursor=first["next_cursor"])
+        self.assertIsNone(later["count"])
+        _, exact = self._get(cursor=first["next_cursor"], count="exact")
+        self.assertEqual(exact["count"], 8)
+
+    def test_offset_is_capped(self):
+        resp, data = self._get(offset=5, limit=3)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([row["id"] for row in data["results"]], self._expected()[5:8])
+        for offset in (6, -1):
+            resp, _ = self._get(offset=offset)
+            self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(RENDER_INPROCESS_WORKERS=0)
+class TripListQueryTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="driver@example.com", password="x")
+        calc = {
+            "places": {"pickup": {"name": "Pickup"}},
+            "route": {"distance_m": 1000.0, "geometry": {"coordinates": LINE}},
+        }
+        for _ in range(5):
+            trip = Trip.objects.create(user=user, calc_payload=calc)
+            record_summary(trip)
+            for page in range(2):
+                TripLogFile.objects.create(trip=trip, page_index=page)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_list_query_count(self):
+        # approx count, the page joined with its summaries, the log files prefetch
+        with self.assertNumQueries(3):
+            data = self.client.get("/api/trips", {"limit": 3}).json()
+        self.assertEqual(len(data["results"]), 3)
+        row = data["results"][0]
+        self.assertEqual(row["calc_payload"]["places"]["pickup"]["name"], "Pickup")
+        self.assertEqual(row["calc_payload"]["route"]["distance_m"], 1000.0)
+        self.assertEqual(len(row["files"]), 2)
+
+        # cursor pages skip the count
+        with self.assertNumQueries(2):
+            self.client.get("/api/trips", {"limit": 3, "cursor": data["next_cursor"]})
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+
+    def _cache(self, **kwargs):
+        return cache.TieredCache("test", alias="default", **kwargs)
+
+    def test_lru_evicts_least_recently_used(self):
+        c = self._cache(lru_size=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")  # a is now the most recent
+        c.set("c", 3)
+        self.assertEqual(c.stats()["local_size"], 2)
+
+        self.assertEqual((c.get("a"), c.get("c")), (1, 3))
+        self.assertEqual(c.stats()["hits_shared"], 0)
+        self.assertEqual(c.get("b"), 2)  # evicted locally, still in the shared tier
+        self.assertEqual(c.stats()["hits_shared"], 1)
+
+    def test_lru_is_bounded_by_bytes(self):
+        c = self._cache(lru_size=100, lru_bytes=100, sizeof=len)
+        c.set("a", "x" * 60)
+        c.set("b", "y" * 60)
+        self.assertEqual((c.stats()["local_size"], c.stats()["local_bytes"]), (1, 60))
+        c.set("big", "z" * 200)  # larger than the whole budget: shared tier only
+        self.assertEqual(c.stats()["local_bytes"], 60)
+        self.assertEqual(c.get("big"), "z" * 200)
+        self.assertEqual(c.stats()["hits_shared"], 1)
+
+    def test_local_entries_expire_after_ttl(self):
+        c = self._cache(lru_size=10, ttl=10)
+        with mock.patch.object(cache.time, "monotonic", return_value=1000.0):
+            c.set("a", 1)
+        with mock.patch.object(cache.time, "monotonic", return_value=1005.0):
+            self.assertEqual(c.get("a"), 1)
+        self.assertEqual(c.stats()["hits_local"], 1)
+        with mock.patch.object(cache.time, "monotonic", return_value=1011.0):
+            self.assertEqual(c.get("a"), 1)
+        self.assertEqual(c.stats()["hits_local"], 1)
+        self.assertEqual(c.stats()["hits_shared"], 1)
+
+    def test_stats(self):
+        c = self._cache(lru_size=10)
+        self.assertIsNone(c.stats()["hit_ratio"])
+        c.set("a", 1)
+        c.get("a")
+        c.get("missing")
+        c.clear_local()
+        c.get("a")
+        stats = c.stats()
+        self.assertEqual(
+            {k: stats[k] for k in ("prefix", "hits_local", "hits_shared", "misses", "local_size")},
+            {"prefix": "test", "hits_local": 1, "hits_shared": 1, "misses": 1, "local_size": 1},
+        )
+        self.assertEqual(stats["hit_ratio"], round(2 / 3, 4))
+
+    def test_route_size_estimate(self):
+        route = _fake_route([{"lng": -118, "lat": 34}])
+        route["raw"] = {"legs": [{"annotation": {"distance": [1.0] * 999, "duration": [1.0] * 999}}]}
+        self.assertEqual(routing._route_bytes(route), 4096 + 128 * 1000 + 32 * 1998)
+        self.assertEqual(routing._route_bytes(None), 4096)
+
+
+class UpstreamDeadlineTests(SimpleTestCase):
+    def _client(self, *statuses):
+        client = mock.Mock()
+        client.request.side_effect = [mock.Mock(status_code=s) for s in statuses]
+        self.enterContext(mock.patch.object(http_client, "get_client", return_value=client))
+        return client
+
+    def test_retries_without_deadline(self):
+        client = self._client(503, 503, 200)
+        with mock.patch.object(http_client, "backoff_delay", return_value=0):
+            r = http_client.request("POST", overpass.OVERPASS, retries=2)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(client.request.call_count, 3)
+        self.assertEqual(client.request.call_args.kwargs["timeout"], http_client.host_timeout(overpass.OVERPASS))
+
+    def test_deadline_caps_timeout_and_retries(self):
+        client = self._client(503, 200)
+        with mock.patch.object(http_client, "backoff_delay", return_value=5):
+            r = http_client.request("POST", overpass.OVERPASS, retries=2, deadline=time.monotonic() + 2)
+        self.assertEqual(r.status_code, 503)  # the backoff alone would outlast the deadline
+        self.assertEqual(client.request.call_count, 1)
+        self.assertLessEqual(client.request.call_args.kwargs["timeout"], 2)
+
+    def test_passed_deadline_raises_before_sending(self):
+        client = self._client(200)
+        with self.assertRaises(httpx.TimeoutException):
+            http_client.request("POST", overpass.OVERPASS, deadline=time.monotonic() - 1)
+        client.request.assert_not_called()
+
+    def test_lookup_started_after_deadline_skips_upstream(self):
+        index = mock.Mock(covers=mock.Mock(return_value=False))
+        with (
+            mock.patch.object(overpass, "get_poi_index", return_value=index),
+            mock.patch.object(overpass, "request") as req,
+        ):
+            self.assertEqual(overpass.find_pois(34, -118, "fuel", deadline=time.monotonic() - 1), [])
+            req.assert_not_called()
+            req.return_value = mock.Mock(status_code=200, json=mock.Mock(return_value={"elements": []}))
+            deadline = time.monotonic() + 5
+            overpass.find_pois(34, -118, "fuel", deadline=deadline)
+        self.assertEqual(req.call_args.kwargs["deadline"], deadline)
+        self.assertRegex(req.call_args.kwargs["data"]["data"], r"\[timeout:[1-5]\]")
+
+    @override_settings(POI_LOOKUP_DEADLINE_S=7)
+    def test_resolve_pois_passes_its_deadline(self):
+        interrupts = [{"coord": {"lat": 34, "lng": -118}, "poi_kind": "fuel"}]
+        with mock.patch.object(helpers, "find_pois", return_value=[]) as find:
+            before = time.monotonic()
+            helpers._resolve_pois(interrupts)
+        deadline = find.call_args.kwargs["deadline"]
+        self.assertTrue(before + 7 <= deadline <= time.monotonic() + 7)
+        self.assertEqual(interrupts[0]["poi"], {"name": None, "tags": {}})
@@ -1,11 +1,15 @@
 from django.urls import path
-from .views import calculate_trip
-from .views import TripListCreateView, TripRetrieveDestroyView, TripDownloadView
-
+from .views import calculate_best_origin, calculate_trip, calculate_trip_async, calculate_trip_batch
+from .views import TripListCreateView, TripRetrieveDestroyView, TripDownloadView, TripRenderJobView, RouteGeometryView
 
 urlpatterns = [
     path("trip/calculate", calculate_trip, name="trip_calculate"),
+    path("trip/calculate/async", calculate_trip_async, name="trip_calculate_async"),
+    path("trip/calculate/batch", calculate_trip_batch, name="trip_calculate_batch"),
+    path("trip/calculate/best-origin", calculate_best_origin, name="trip_calculate_best_origin"),
     path("trips/<uuid:pk>", TripRetrieveDestroyView.as_view(), name="trip-detail"),
     path("trips/<uuid:pk>/download", TripDownloadView.as_view(), name="trip-download"),
+    path("trips/<uuid:pk>/render", TripRenderJobView.as_view(), name="trip-render"),
     path("trips", TripListCreateView.as_view(), name="trips"),
+    path("routes/<uuid:pk>/geometry", RouteGeometryView.as_view(), name="route-geometry"),
 ]
@@ -1,12 +1,25 @@
 from __future__ import annotations
 
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import FileResponse, Http404
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.urls import reverse
-from .serializers import TripCalcRequestSer, TripCalcResponseSer
+from .serializers import BestOriginRequestSer, TripCalcRequestSer, TripCalcResponseSer
 
 
 from django.shortcuts import get_object_or_404
@@ -14,67 +27,325 @@ from django.conf import settings
 
 
 from .serializers import LogTripRequestSer
-from .services.rendering import render_and_store_logs
-
-from .serializers import TripSer
+from .services.geometry import RESOLUTIONS
+from .services.route_store import (
+    astore_route_geometry,
+    compact_payload,
+    geometry_geojson,
+    hydrate_payload,
+    store_route_geometry,
+)
+
+from .serializers import RenderJobSer, TripListSer, TripSer
+from .services import catalog, zipstream
+from .services.drafts import areusable_draft, request_hash, reusable_draft, reusable_drafts
+from .services.jobs import can_retry, enqueue_render, latest_job
+from .services.rendering import log_files
+from .services.summary import record_summary
 
 
 from pathlib import Path
 import shutil
 
-from django.db.models import QuerySet
+from django.db import transaction
+from django.db.models import Prefetch, Q, QuerySet
 from rest_framework.views import APIView
 
 
-from .models import Trip, TripCalcDraft, TripLogFile
-from .helpers import plan_trip_payload
+from .models import RenderJob, RouteGeometry, Trip, TripCalcDraft, TripLogFile
+from .helpers import aplan_trip_payload, iter_plan_batch, plan_trip_payload, rank_origins
+
+
+def _resolution_param(params) -> str | None:
+    """?resolution=full|high|medium|low (default settings.ROUTE_RESPONSE_RESOLUTION); None if invalid."""
+    res = (params.get("resolution") or getattr(settings, "ROUTE_RESPONSE_RESOLUTION", "full")).lower()
+    return res if res in RESOLUTIONS else None
+
+
+def _bbox_param(params):
+    """?bbox=west,south,east,north -> tuple, None if absent; raises ValueError if malformed."""
+    raw = params.get("bbox")
+    if not raw:
+        return None
+    west, south, east, north = (float(v) for v in raw.split(","))
+    if west >= east or south >= north:
+        raise ValueError("bbox must be west,south,east,north")
+    return (west, south, east, north)
+
+
+def _calc_response(resp: dict, geom: RouteGeometry, draft: TripCalcDraft, resolution: str) -> dict:
+    route = {**resp["route"], "geometry_id": str(geom.id)}
+    if resolution != "full":
+        route["geometry"] = geometry_geojson(geom, resolution)
+    out = TripCalcResponseSer(data={**resp, "route": route, "draft_id": draft.id})
+    out.is_valid(raise_exception=True)
+    return out.data
+
+
+_BAD_RESOLUTION = {"detail": f"resolution must be one of {', '.join(RESOLUTIONS)}"}
+
+
+def _plan_draft(user, d):
+    """
+    (payload, geometry, draft) for a validated calculate request. A recent
+    unlogged draft of the same user for the identical request is returned
+    as-is, so repeated clicks neither re-plan nor insert another copy.
+    """
+    key = request_hash(d)
+    draft = reusable_draft(user, key)
+    if draft is not None:
+        return hydrate_payload(draft.payload, draft.route_geometry), draft.route_geometry, draft
+
+    resp = plan_trip_payload(d)
+
+    geom = store_route_geometry(resp["route"]["geometry"], resp["route"].get("bbox"))
+    draft = TripCalcDraft.objects.create(
+        user=user, payload=compact_payload(resp, geom), route_geometry=geom, request_hash=key
+    )
+    return resp, geom, draft
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def calculate_trip(request):
+    resolution = _resolution_param(request.query_params)
+    if resolution is None:
+        return Response(_BAD_RESOLUTION, status=status.HTTP_400_BAD_REQUEST)
     ser = TripCalcRequestSer(data=request.data)
     if not ser.is_valid():
         return Response({"errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
     d = ser.validated_data
 
-    resp = plan_trip_payload(d)
+    resp, geom, draft = _plan_draft(request.user, d)
 
-    draft = TripCalcDraft.objects.create(user=request.user, payload=resp)
+    return Response(_calc_response(resp, geom, draft, resolution), status=200)
 
-    draft.save()
 
-    resp_with_id = {**resp, "draft_id": draft.id}
-    out = TripCalcResponseSer(data=resp_with_id)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def calculate_best_origin(request):
+    """
+    Pick the candidate start location (driver/truck) closest in driving time to
+    the pickup using one OSRM table call, then plan the trip from it exactly as
+    calculate_trip does. The response adds
+    "origin": {"index", "ranking": [{"index", "duration_s", "distance_m"}, ...]}.
+    """
+    resolution = _resolution_param(request.query_params)
+    if resolution is None:
+        return Response(_BAD_RESOLUTION, status=status.HTTP_400_BAD_REQUEST)
+    ser = BestOriginRequestSer(data=request.data)
+    if not ser.is_valid():
+        return Response({"errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+    d = dict(ser.validated_data)
+    candidates = d.pop("candidates")
+
+    ranking = rank_origins(candidates, d["pickupLocation"])
+    best = ranking[0]
+    if best["duration_s"] is None:
+        return Response(
+            {"detail": "No candidate can reach the pickup.", "ranking": ranking},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    d["currentLocation"] = candidates[best["index"]]
 
-    out.is_valid(raise_exception=True)
+    resp, geom, draft = _plan_draft(request.user, d)
+
+    out = _calc_response(resp, geom, draft, resolution)
+    out["origin"] = {"index": best["index"], "ranking": ranking}
+    return Response(out, status=200)
+
+
+def _ndjson(obj) -> bytes:
+    return (json.dumps(obj, cls=DjangoJSONEncoder) + "\n").encode("utf-8")
+
+
+def _stream_batch(user, valid: list, invalid: list):
+    """
+    NDJSON lines for calculate_trip_batch: validation errors first, then one line
+    per planned trip in completion order. Identical requests (same request hash)
+    share one draft: a recent unlogged one of the user's if there is one (those
+    lines come right after the errors), else one planned here. Each group of
+    finished plans becomes one bulk_create; a route shared by several trips is
+    stored once.
+    """
+    for line in invalid:
+        yield _ndjson(line)
+
+    indexes = {}  # request hash -> positions in the request, in order
+    todo = []  # (request hash, validated data) of the first item per hash
+    for index, d in valid:
+        key = request_hash(d)
+        if key not in indexes:
+            indexes[key] = []
+            todo.append((key, d))
+        indexes[key].append(index)
+
+    reused = reusable_drafts(user, indexes)
+    if reused:
+        lines = [
+            {"index": i, "draft_id": draft.id, **draft.payload} for key, draft in reused.items() for i in indexes[key]
+        ]
+        yield b"".join(_ndjson(line) for line in sorted(lines, key=lambda line: line["index"]))
+        todo = [(key, d) for key, d in todo if key not in reused]
+
+    geoms = {}
+    chunk = getattr(settings, "TRIP_BATCH_DRAFT_CHUNK", 50)
+    for ready in iter_plan_batch([d for _, d in todo], chunk=chunk):
+        drafts, lines = [], []
+        for j, route, payload, error in ready:
+            key = todo[j][0]
+            if error is not None:
+                lines.extend({"index": i, "detail": "Route planning failed."} for i in indexes[key])
+                continue
+            geom = geoms.get(route)
+            if geom is None:
+                geom = geoms[route] = store_route_geometry(payload["route"]["geometry"], payload["route"].get("bbox"))
+            draft = TripCalcDraft(
+                user=user, payload=compact_payload(payload, geom), route_geometry=geom, request_hash=key
+            )
+            drafts.append(draft)
+            lines.extend({"index": i, "draft_id": draft.id, **draft.payload} for i in indexes[key])
+        TripCalcDraft.objects.bulk_create(drafts)
+        yield b"".join(_ndjson(line) for line in lines)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def calculate_trip_batch(request):
+    """
+    Plan up to settings.TRIP_BATCH_MAX_TRIPS trips posted as {"trips": [...]}
+    (each shaped like a calculate_trip body). The response is NDJSON, one line
+    per trip as it finishes, tagged with its position in the request:
+    {"index", "draft_id", "route", "stops", ...} on success, {"index", "errors"}
+    or {"index", "detail"} otherwise. Identical trips get the same draft_id.
+    Route geometry is referenced by route.geometry_id (see RouteGeometryView).
+    """
+    items = request.data.get("trips") if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({"detail": "trips must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    max_trips = getattr(settings, "TRIP_BATCH_MAX_TRIPS", 500)
+    if len(items) > max_trips:
+        return Response({"detail": f"at most {max_trips} trips per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+    valid, invalid = [], []
+    for i, item in enumerate(items):
+        ser = TripCalcRequestSer(data=item)
+        if ser.is_valid():
+            valid.append((i, ser.validated_data))
+        else:
+            invalid.append({"index": i, "errors": ser.errors})
+
+    resp = StreamingHttpResponse(_stream_batch(request.user, valid, invalid), content_type="application/x-ndjson")
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+async def _aauthenticate(request):
+    """JWT auth for plain async views (DRF's APIView/api_view are sync-only)."""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as exc:
+        return None, exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+    if result is None:
+        return None, {"detail": "Authentication credentials were not provided."}
+    return result[0], None
+
+
+@csrf_exempt
+async def calculate_trip_async(request):
+    """
+    Async twin of calculate_trip for ASGI deployments: upstream OSRM/Overpass
+    calls and the draft insert are awaited, so a worker is not tied up while
+    they are in flight.
+    """
+    if request.method != "POST":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    user, auth_error = await _aauthenticate(request)
+    if user is None:
+        return JsonResponse(auth_error, status=status.HTTP_401_UNAUTHORIZED)
+    resolution = _resolution_param(request.GET)
+    if resolution is None:
+        return JsonResponse(_BAD_RESOLUTION, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ser = TripCalcRequestSer(data=body)
+    if not ser.is_valid():
+        return JsonResponse({"errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+    d = ser.validated_data
+
+    key = request_hash(d)
+    draft = await areusable_draft(user, key)
+    if draft is not None:
+        geom = draft.route_geometry
+        return JsonResponse(_calc_response(hydrate_payload(draft.payload, geom), geom, draft, resolution), status=200)
+
+    resp = await aplan_trip_payload(d)
 
-    return Response(out.data, status=200)
+    geom = await astore_route_geometry(resp["route"]["geometry"], resp["route"].get("bbox"))
+    draft = await TripCalcDraft.objects.acreate(
+        user=user, payload=compact_payload(resp, geom), route_geometry=geom, request_hash=key
+    )
+
+    return JsonResponse(_calc_response(resp, geom, draft, resolution), status=200)
 
 
 def _safe_sort(sort: str | None) -> str:
     """
     Allow ?sort=created|-created|updated|-updated (default -created).
+    Trips are never edited, so "updated" orders by creation time too.
     """
     allowed = {
         "created": "created_at",
         "-created": "-created_at",
-        "updated": "updated_at",
-        "-updated": "-updated_at",
+        "updated": "created_at",
+        "-updated": "-created_at",
     }
     return allowed.get((sort or "").lower(), "-created_at")
 
 
+def _encode_cursor(trip: Trip, direction: str) -> str:
+    """Opaque position of `trip` in the list; direction "n" pages after it, "p" before it."""
+    raw = json.dumps([trip.created_at.isoformat(), str(trip.id), direction])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str) -> tuple | None:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created, pk, direction = json.loads(raw)
+        if direction not in ("n", "p"):
+            return None
+        return datetime.fromisoformat(created), uuid.UUID(pk), direction
+    except (ValueError, TypeError):
+        return None
+
+
+def _count(qs: QuerySet[Trip], mode: str) -> tuple[int | None, bool]:
+    """(count, exact) for ?count=exact|approx|none; approx stops counting at TRIP_LIST_COUNT_CAP."""
+    if mode == "none":
+        return None, False
+    if mode == "approx":
+        cap = getattr(settings, "TRIP_LIST_COUNT_CAP", 1000)
+        n = qs[: cap + 1].count()
+        return min(n, cap), n <= cap
+    return qs.count(), True
+
+
 def _user_trips(qs: QuerySet[Trip], user) -> QuerySet[Trip]:
     return qs.filter(user=user)
 
 
 def _delete_trip_files(trip: Trip) -> None:
     """
-    Remove files on disk and DB rows in TripLogFile (then Trip row).
-    Assumes your files live under MEDIA_ROOT/trips/<trip.id>/...
+    Remove the trip's rendered files and their TripFile/TripLogFile rows (then Trip row).
+    Files are found through the catalog; trips rendered before it existed fall back to
+    removing MEDIA_ROOT/trips/<trip.id>/ wholesale.
     """
-
+    if catalog.delete_files(trip):
+        return
     try:
         from django.conf import settings
 
@@ -93,17 +364,68 @@ class TripListCreateView(APIView):
         """
         List trips for the current user.
         ?sort=created|-created|updated|-updated (default -created)
-        Optional pagination: ?limit=20&offset=0
+        ?limit=N (default 50, at most TRIP_LIST_MAX_LIMIT)
+        ?cursor=<next_cursor|prev_cursor> pages by (created_at, id) in constant time;
+        ?offset=N still works without a cursor, up to TRIP_LIST_MAX_OFFSET.
+        ?count=exact|approx|none (default approx, or none with a cursor)
         """
         sort = _safe_sort(request.query_params.get("sort"))
-        limit = int(request.query_params.get("limit", 50))
-        offset = int(request.query_params.get("offset", 0))
-
-        qs = _user_trips(Trip.objects.all(), request.user).order_by(sort)
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        data = TripSer(items, many=True).data
-        return Response({"count": total, "results": data})
+        try:
+            limit = int(request.query_params.get("limit", 50))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, getattr(settings, "TRIP_LIST_MAX_LIMIT", 100)))
+        max_offset = getattr(settings, "TRIP_LIST_MAX_OFFSET", 1000)
+        if not 0 <= offset <= max_offset:
+            return Response(
+                {"detail": f"offset must be between 0 and {max_offset}; page further with cursor"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        cursor = None
+        if request.query_params.get("cursor"):
+            cursor = _decode_cursor(request.query_params["cursor"])
+            if cursor is None:
+                return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        count_mode = (request.query_params.get("count") or ("none" if cursor else "approx")).lower()
+        if count_mode not in ("exact", "approx", "none"):
+            return Response({"detail": "count must be exact, approx or none"}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = _user_trips(Trip.objects.all(), request.user)
+        total, exact = _count(qs, count_mode)
+
+        desc = sort.startswith("-")
+        order = ["-created_at", "-id"] if desc else ["created_at", "id"]
+        forward = cursor is None or cursor[2] == "n"
+        if cursor is not None:
+            created, pk, _ = cursor
+            # rows past the cursor in list order (forward) or before it (backward)
+            op = "lt" if forward == desc else "gt"
+            qs = qs.filter(Q(**{f"created_at__{op}": created}) | Q(created_at=created, **{f"id__{op}": pk}))
+            offset = 0
+        if not forward:
+            order = [o[1:] if o.startswith("-") else f"-{o}" for o in order]
+
+        # list rows never load calc_payload: summary comes joined, files in one prefetch
+        logs = Prefetch("logs", queryset=TripLogFile.objects.order_by("page_index"))
+        page = qs.order_by(*order).defer("calc_payload", "extras").select_related("summary").prefetch_related(logs)
+        items = list(page[offset : offset + limit + 1])
+        more = len(items) > limit
+        items = items[:limit]
+        if not forward:
+            items.reverse()
+
+        has_next = more if forward else bool(items)
+        has_prev = (cursor is not None or offset > 0) if forward else more
+        return Response(
+            {
+                "count": total,
+                "count_exact": exact,
+                "next_cursor": _encode_cursor(items[-1], "n") if items and has_next else None,
+                "prev_cursor": _encode_cursor(items[0], "p") if items and has_prev else None,
+                "results": TripListSer(items, many=True).data,
+            }
+        )
 
     def post(self, request):
         ser = LogTripRequestSer(data=request.data)
@@ -114,21 +436,22 @@ class TripListCreateView(APIView):
         if draft.is_logged:
             return Response({"detail": "Draft already logged."}, status=status.HTTP_409_CONFLICT)
 
-        trip = Trip.objects.create(
-            user=request.user,
-            calc_payload=draft.payload,
-            extras={k: v for k, v in ser.validated_data.items() if k != "draft_id"},
-        )
+        with transaction.atomic():
+            trip = Trip.objects.create(
+                user=request.user,
+                calc_payload=draft.payload,
+                route_geometry_id=draft.route_geometry_id,
+                extras={k: v for k, v in ser.validated_data.items() if k != "draft_id"},
+            )
+            record_summary(trip)
+            # logs render in the background; poll trips/<id>/render for progress
+            job = enqueue_render(trip)
 
-        trip.save()
-        files = render_and_store_logs(trip)
+            draft.is_logged = True
+            draft.save(update_fields=["is_logged"])
 
         out = TripSer(trip).data
-        out["files"] = files
-
-        draft.is_logged = True
-        draft.save(update_fields=["is_logged"])
-
+        out["render_job"] = RenderJobSer(job).data
         return Response(out, status=status.HTTP_201_CREATED)
 
 
@@ -136,8 +459,13 @@ class TripRetrieveDestroyView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
-        trip = get_object_or_404(_user_trips(Trip.objects, request.user), pk=pk)
+        """?resolution=full|high|medium|low selects the route geometry detail level."""
+        resolution = _resolution_param(request.query_params)
+        if resolution is None:
+            return Response(_BAD_RESOLUTION, status=status.HTTP_400_BAD_REQUEST)
+        trip = get_object_or_404(_user_trips(Trip.objects.select_related("route_geometry"), request.user), pk=pk)
         data = TripSer(trip).data
+        data["calc_payload"] = hydrate_payload(data["calc_payload"], trip.route_geometry, resolution)
 
         dl_base = reverse("trip-download", kwargs={"pk": pk})
         html_zip = request.build_absolute_uri(f"{dl_base}?format=html")
@@ -154,35 +482,148 @@ class TripRetrieveDestroyView(APIView):
         Delete a trip and its generated files.
         """
         trip = get_object_or_404(_user_trips(Trip.objects, request.user), pk=pk)
-        _delete_trip_files(trip)
-        trip.delete()
+        with transaction.atomic():
+            # a render finishing meanwhile waits on this lock, then finds the trip gone
+            Trip.objects.select_for_update().filter(pk=trip.pk).exists()
+            _delete_trip_files(trip)
+            trip.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class _ArchiveNegotiation(DefaultContentNegotiation):
+    """?format= picks the archive type here, not a DRF renderer."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def _zip_method(arcname: str) -> int:
+    # PDFs and PNGs are already compressed; deflating them only costs CPU
+    return zipstream.STORED if arcname.endswith((".pdf", ".png")) else zipstream.DEFLATED
+
+
 class TripDownloadView(APIView):
     permission_classes = [IsAuthenticated]
+    content_negotiation_class = _ArchiveNegotiation
 
     def get(self, request, pk):
+        """
+        Zip of the trip's per-day logs (?format=html|pdf|png), assembled on the fly
+        from the catalogued files. The bytes are deterministic for the same files,
+        so the response carries a strong ETag (If-None-Match -> 304) and honours
+        single byte ranges (Range / If-Range). Without files: 202 while a render is
+        queued or running (starting one if needed), 404 when the finished render
+        produced none, 500 with the job's error once retries are used up.
+        """
         fmt = (request.query_params.get("format") or "pdf").lower()
-        if fmt not in ("html", "pdf"):
-            return Response({"detail": "format must be html or pdf"}, status=status.HTTP_400_BAD_REQUEST)
+        if fmt not in ("html", "pdf", "png"):
+            return Response({"detail": "format must be html, pdf or png"}, status=status.HTTP_400_BAD_REQUEST)
 
         trip = get_object_or_404(Trip.objects.filter(user=request.user), pk=pk)
 
-        base_dir = Path(settings.MEDIA_ROOT) / "trips" / str(trip.id).strip() / "logs"
-        zip_name = "daily_logs_html.zip" if fmt == "html" else "daily_logs_pdf.zip"
-        zip_path = base_dir / zip_name
-
-        if not zip_path.exists():
+        files = log_files(trip, fmt)
+        if not files:
+            job = latest_job(trip)
+            if job is not None and job.status == RenderJob.FAILED and not can_retry(trip):
+                return Response(
+                    {"detail": "Rendering the logs failed.", "error": job.error, "render_job": RenderJobSer(job).data},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            if job is not None and job.status == RenderJob.DONE:
+                return Response({"detail": f"This trip has no {fmt} logs."}, status=status.HTTP_404_NOT_FOUND)
+            if job is None or job.status == RenderJob.FAILED:
+                job = enqueue_render(trip)
+            resp = Response(
+                {"detail": "Logs are being rendered; retry shortly.", "render_job": RenderJobSer(job).data},
+                status=status.HTTP_202_ACCEPTED,
+            )
+            resp["Retry-After"] = "5"
+            return resp
+
+        etag = zipstream.archive_etag(files, _zip_method)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            resp = HttpResponseNotModified()
+            resp["ETag"] = etag
+            return resp
+
+        # the counting pass reads every member once; reuse it for repeat/range requests
+        cache_key = f"trip-zip:{trip.id}:{etag}"
+        entries = cache.get(cache_key)
+        if entries is None:
+            entries = zipstream.scan(files, _zip_method)
+            cache.set(cache_key, entries, 3600)
+        archive = zipstream.ZipStream(entries)
+
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if if_range is None or if_range == etag:
             try:
-                render_and_store_logs(trip)
-            except Exception:
-                pass
-
-        if not zip_path.exists():
-            raise Http404("Requested zip not found")
-
-        resp = FileResponse(open(zip_path, "rb"), content_type="application/zip")
+                byte_range = zipstream.parse_range(request.headers.get("Range"), archive.size)
+            except ValueError:
+                resp = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                resp["Content-Range"] = f"bytes */{archive.size}"
+                return resp
+
+        if byte_range is None:
+            resp = StreamingHttpResponse(archive.iter_bytes(), content_type="application/zip")
+            resp["Content-Length"] = str(archive.size)
+        else:
+            first, last = byte_range
+            resp = StreamingHttpResponse(
+                archive.iter_bytes(first, last),
+                content_type="application/zip",
+                status=status.HTTP_206_PARTIAL_CONTENT,
+            )
+            resp["Content-Length"] = str(last - first + 1)
+            resp["Content-Range"] = f"bytes {first}-{last}/{archive.size}"
         resp["Content-Disposition"] = f'attachment; filename="trip-{trip.id}-{fmt}.zip"'
-        resp["Content-Length"] = zip_path.stat().st_size
+        resp["Accept-Ranges"] = "bytes"
+        resp["ETag"] = etag
+        resp["Cache-Control"] = "private, no-cache"
         return resp
+
+
+class TripRenderJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """Status of the trip's latest render job (queued|running|done|failed)."""
+        trip = get_object_or_404(_user_trips(Trip.objects, request.user), pk=pk)
+        job = latest_job(trip)
+        if job is None:
+            raise Http404("No render job for this trip")
+        return Response(RenderJobSer(job).data)
+
+    def post(self, request, pk):
+        """Queue a fresh render unless one is already queued or running."""
+        trip = get_object_or_404(_user_trips(Trip.objects, request.user), pk=pk)
+        job = latest_job(trip)
+        if job is not None and job.status in (RenderJob.QUEUED, RenderJob.RUNNING):
+            return Response(RenderJobSer(job).data, status=status.HTTP_409_CONFLICT)
+        return Response(RenderJobSer(enqueue_render(trip)).data, status=status.HTTP_202_ACCEPTED)
+
+
+class RouteGeometryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        GeoJSON for a stored route at ?resolution=full|high|medium|low, optionally
+        clipped to ?bbox=west,south,east,north (returned as a MultiLineString).
+        """
+        resolution = _resolution_param(request.query_params)
+        if resolution is None:
+            return Response(_BAD_RESOLUTION, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bbox = _bbox_param(request.query_params)
+        except ValueError:
+            return Response({"detail": "bbox must be west,south,east,north"}, status=status.HTTP_400_BAD_REQUEST)
+
+        geom = get_object_or_404(RouteGeometry, pk=pk)
+        owned = (
+            TripCalcDraft.objects.filter(user=request.user, route_geometry=geom).exists()
+            or _user_trips(Trip.objects, request.user).filter(route_geometry=geom).exists()
+        )
+        if not owned:
+            raise Http404("Route not found")
+        return Response(geometry_geojson(geom, resolution, bbox))